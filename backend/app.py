@@ -5,50 +5,236 @@ Integrates all audio processing functionality from the existing scripts.
 """
 
 import os
+import atexit
+import hashlib
+import json
+import logging
+import logging.handlers
+import mmap
+import queue
 import shutil
+import threading
 import tempfile
-import requests
-from flask import Flask, request, jsonify, send_file
+import uuid
+from collections import OrderedDict
+from flask import Flask, Response, request, jsonify, send_file, abort
+from flask.json.provider import JSONProvider
 from flask_cors import CORS
+from flask_compress import Compress
+from werkzeug.exceptions import RequestEntityTooLarge
 from werkzeug.utils import secure_filename
+from streaming_form_data import StreamingFormDataParser
+from streaming_form_data.parser import ParseFailedException
+from streaming_form_data.targets import FileTarget, ValueTarget
 import time
-from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
 try:
     from dotenv import load_dotenv
     load_dotenv()
 except ImportError:
     pass
-
-# Vercel blob storage
-from vercel_blob import put, delete
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 # Import our existing audio processing modules
 from spotify_transcriber import AudioToMIDITranscriber
 from dual_instrument_recorder import DualInstrumentRecorder
-import test_vocals_midi
+
+class OrjsonProvider(JSONProvider):
+    """Route jsonify() and request.get_json() through orjson's C encoder"""
+    
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS).decode('utf-8')
+    
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+class JsonLogFormatter(logging.Formatter):
+    """Format each log record as a single-line JSON object"""
+    
+    def format(self, record):
+        entry = {
+            'time': self.formatTime(record),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry)
+
+def configure_logging():
+    """
+    Log JSON lines to stderr at LOG_LEVEL (default INFO). Records are handed
+    to a background listener thread so request threads never wait on the write.
+    """
+    root = logging.getLogger()
+    if root.handlers:
+        return
+    
+    log_queue = queue.SimpleQueue()
+    queue_handler = logging.handlers.QueueHandler(log_queue)
+    queue_handler.setFormatter(JsonLogFormatter())
+    root.addHandler(queue_handler)
+    root.setLevel(os.getenv('LOG_LEVEL', 'INFO').upper())
+    
+    listener = logging.handlers.QueueListener(log_queue, logging.StreamHandler())
+    listener.start()
+    atexit.register(listener.stop)
+
+configure_logging()
+logger = logging.getLogger(__name__)
 
 app = Flask(__name__)
+if orjson is not None:
+    app.json = OrjsonProvider(app)
 CORS(app)
 
 # Configuration
-UPLOAD_FOLDER = 'uploads'
-ALLOWED_EXTENSIONS = {'mid', 'midi'}
+UPLOAD_FOLDER = os.getenv('UPLOAD_FOLDER', 'uploads')
+# Uploaded audio (and the transcriber's noise-reduced copy next to it) only
+# lives for one request; point this at a tmpfs such as /dev/shm/audio to keep
+# that write-then-read round trip in RAM
+AUDIO_TEMP_DIR = os.getenv('AUDIO_TEMP_DIR', tempfile.gettempdir())
+ALLOWED_EXTENSIONS = frozenset({'mid', 'midi'})
+# Content types for files served from UPLOAD_FOLDER, keyed by lowercased extension
+SERVED_MIMETYPES = {
+    '.mid': 'audio/midi',
+    '.midi': 'audio/midi',
+    '.wav': 'audio/wav',
+    '.mp3': 'audio/mpeg',
+}
 MAX_FILE_SIZE = 16 * 1024 * 1024  # 16MB max file size
+UPLOAD_CHUNK_SIZE = 64 * 1024  # Bytes read from the request stream per iteration
+FILE_COPY_BUFFER_SIZE = 1024 * 1024  # Buffer for saving uploaded parts (Werkzeug defaults to 16KB)
+# Request body types accepted as a bare WAV upload, with no multipart wrapping
+RAW_AUDIO_MIMETYPES = frozenset({'audio/wav', 'audio/x-wav', 'audio/wave', 'application/octet-stream'})
 PORT = 3001
 
-# Vercel blob storage configuration
+# Let Werkzeug refuse oversized bodies before anything is buffered
+app.config['MAX_CONTENT_LENGTH'] = MAX_FILE_SIZE
+
+# Behind Apache mod_xsendfile or lighttpd, send_file can emit X-Sendfile instead
+# of the file body; the front server then sends (and may compress) the bytes
+app.config['USE_X_SENDFILE'] = os.getenv('USE_X_SENDFILE') == '1'
 
+# Compress JSON and MIDI responses with zstd, brotli or gzip, whichever the
+# client accepts (MIDI event data compresses well; WAV/MP3 don't)
+app.config['COMPRESS_MIMETYPES'] = ['application/json']
+if not app.config['USE_X_SENDFILE']:
+    app.config['COMPRESS_MIMETYPES'].append('audio/midi')
+# send_file responses are streamed, and Flask-Compress leaves gzip out of its
+# streaming algorithms by default; add it back so gzip-only clients get it too
+app.config['COMPRESS_ALGORITHM_STREAMING'] = ['zstd', 'br', 'gzip', 'deflate']
+# Still answer their If-None-Match with 304
+app.config['COMPRESS_STREAMING_ENDPOINT_CONDITIONAL'] = ['serve_file', 'download_transcription_job']
+Compress(app)
 
-# Set the Vercel blob token for the library
+# Served files are named by timestamp and uuid and never rewritten, so browsers may cache them
+SERVED_FILE_MAX_AGE = 24 * 60 * 60
 
+# When running behind nginx, hand /uploads downloads back to it instead of
+# streaming the bytes through a worker. Set to the internal location, e.g.
+#   location /internal_uploads/ { internal; alias /path/to/backend/uploads/; }
+#   ACCEL_REDIRECT_PREFIX=/internal_uploads/
+ACCEL_REDIRECT_PREFIX = os.getenv('ACCEL_REDIRECT_PREFIX')
 
-# Ensure upload directory exists
+# Background transcription jobs
+JOBS_FOLDER = os.path.join(UPLOAD_FOLDER, 'jobs')
+TRANSCRIPTION_WORKERS = int(os.getenv('TRANSCRIPTION_WORKERS', '2'))
+JOB_RETENTION_SECONDS = 60 * 60  # Forget finished jobs after an hour
+# Queued or processing jobs untouched for this long are marked failed once the
+# worker process that took them is gone (restarted or killed). Jobs whose
+# worker is still running are left alone, however long they wait in its queue.
+JOB_TIMEOUT_SECONDS = int(os.getenv('JOB_TIMEOUT_SECONDS', 5 * 60))
+JOB_QUEUED = 'queued'
+JOB_PROCESSING = 'processing'
+JOB_COMPLETED = 'completed'
+JOB_FAILED = 'failed'
+
+# Recently transcribed uploads, so re-sending the same audio skips inference
+MIDI_CACHE_SIZE = 32
+
+# Periodically delete generated files, and temp audio orphaned by a crashed
+# request, once they are older than UPLOAD_RETENTION_SECONDS
+UPLOAD_RETENTION_SECONDS = int(os.getenv('UPLOAD_RETENTION_SECONDS', 24 * 60 * 60))
+SWEEP_INTERVAL_SECONDS = 10 * 60
+TEMP_AUDIO_SUFFIXES = ('_audio.wav', '_audio_noise_reduced.wav')
+
+# Ensure upload directories exist
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
+os.makedirs(JOBS_FOLDER, exist_ok=True)
+os.makedirs(AUDIO_TEMP_DIR, exist_ok=True)
+
+job_executor = ThreadPoolExecutor(max_workers=TRANSCRIPTION_WORKERS)
+cleanup_executor = ThreadPoolExecutor(max_workers=2)
+
+# One transcriber per worker process, shared with the recorder used by
+# combine-midi. transcribe_file keeps no per-call state on the instance, so
+# concurrent requests can share it without a lock.
+transcriber = AudioToMIDITranscriber()
+atexit.register(transcriber.cleanup)
+recorder = DualInstrumentRecorder(transcriber=transcriber)
+
+# Audio content hash -> MIDI filename in UPLOAD_FOLDER, least recently used first
+midi_cache = OrderedDict()
+midi_cache_lock = threading.Lock()
+
+class TranscriptionError(Exception):
+    """Raised when the transcriber runs but produces no usable MIDI file"""
 
 def allowed_file(filename):
     """Check if the uploaded file has an allowed extension"""
-    return '.' in filename and \
-           filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
+    return os.path.splitext(filename)[1][1:].lower() in ALLOWED_EXTENSIONS
+
+def request_too_large():
+    """Check the declared Content-Length before any of the body is read"""
+    return request.content_length is not None and request.content_length > MAX_FILE_SIZE
+
+def stream_audio_upload(audio_path):
+    """
+    Stream a multipart/form-data upload straight to disk without going
+    through Werkzeug's form parser (which spools large parts to a temp file).
+    
+    Args:
+        audio_path (str): Where to write the 'audio' part
+        
+    Returns:
+        tuple: (audio_filename, instrument_name) - audio_filename is None if
+        no 'audio' part was sent
+    """
+    parser = StreamingFormDataParser(headers=request.headers)
+    audio_target = FileTarget(audio_path)
+    instrument_target = ValueTarget()
+    parser.register('audio', audio_target)
+    parser.register('instrument', instrument_target)
+    
+    while True:
+        chunk = request.stream.read(UPLOAD_CHUNK_SIZE)
+        if not chunk:
+            break
+        parser.data_received(chunk)
+    
+    instrument_name = instrument_target.value.decode('utf-8', errors='replace')
+    return audio_target.multipart_filename, instrument_name
+
+def stream_raw_audio_upload(audio_path):
+    """
+    Copy a bare audio request body straight to disk. The instrument and the
+    original filename come from the query string.
+    
+    Args:
+        audio_path (str): Where to write the request body
+        
+    Returns:
+        tuple: (audio_filename, instrument_name)
+    """
+    with open(audio_path, 'wb') as f:
+        shutil.copyfileobj(request.stream, f, FILE_COPY_BUFFER_SIZE)
+    
+    return request.args.get('filename', 'audio.wav'), request.args.get('instrument', '')
 
 @app.route('/api/health', methods=['GET'])
 def health_check():
@@ -58,119 +244,352 @@ def health_check():
         'message': 'Audio-to-MIDI Flask server is running',
         'available_routes': [
             '/api/transcribe-single',
+            '/api/jobs',
+            '/api/jobs/<job_id>',
+            '/api/jobs/<job_id>/midi',
             '/api/transcribe-vocals', 
             '/api/combine-midi',
             '/api/health'
         ]
     })
-#ROUTE THAT IS ACTUALLY USED 
-@app.route('/api/transcribe-single', methods=['POST'])
-def transcribe_single():
+
+def receive_audio_upload(temp_audio_path):
     """
-    Route for spotify_transcriber.py functionality - single audio file to MIDI conversion
-    Expects a .wav audio file in the request
-    Converts to MIDI and returns the MIDI file directly
+    Validate the current request and stream its 'audio' part to temp_audio_path
+    
+    Args:
+        temp_audio_path (str): Where to write the uploaded audio
+        
+    Returns:
+        tuple: (instrument_name, error_response) - error_response is None if
+        the upload was saved successfully
     """
-    temp_audio_path = None
+    # Check the upload format before touching the stream
+    if request.mimetype == 'multipart/form-data':
+        stream_upload = stream_audio_upload
+    elif request.mimetype in RAW_AUDIO_MIMETYPES:
+        stream_upload = stream_raw_audio_upload
+    else:
+        return None, (jsonify({'error': 'No audio file provided'}), 400)
+    
+    try:
+        audio_filename, instrument_name = stream_upload(temp_audio_path)
+    except RequestEntityTooLarge as e:
+        # Chunked uploads have no Content-Length, so the limit trips mid-stream
+        return None, too_large(e)
+    except ParseFailedException as e:
+        return None, (jsonify({
+            'success': False,
+            'error': 'Failed to save audio file',
+            'details': str(e)
+        }), 400)
+    
+    # Check if audio file was uploaded
+    if audio_filename is None:
+        return None, (jsonify({'error': 'No audio file provided'}), 400)
+    if audio_filename == '':
+        return None, (jsonify({'error': 'No audio file selected'}), 400)
+    
+    # Check if it's a valid audio file
+    if os.path.splitext(audio_filename)[1].lower() != '.wav':
+        return None, (jsonify({'error': 'Only .wav files are supported'}), 400)
+    
+    # Get instrument name from form data
+    if not instrument_name or instrument_name.strip() == '':
+        instrument_name = 'Unknown'
+    
+    logger.info("Processing audio file %s (instrument: %s)", audio_filename, instrument_name)
+    logger.debug("Saved audio file: %s", temp_audio_path)
+    
+    # Verify file was saved and has content
+    if not os.path.exists(temp_audio_path) or os.path.getsize(temp_audio_path) == 0:
+        return None, (jsonify({
+            'success': False,
+            'error': 'Failed to save audio file or file is empty'
+        }), 400)
+    
+    logger.debug("Audio file size: %d bytes", os.path.getsize(temp_audio_path))
+    return instrument_name, None
+
+def remove_file(path, description):
+    """Remove a temporary file, logging instead of raising on failure"""
+    if path and os.path.exists(path):
+        try:
+            os.remove(path)
+            logger.debug("Cleaned up %s: %s", description, path)
+        except Exception as e:
+            logger.warning("Could not remove %s %s: %s", description, path, e)
+
+def remove_file_later(path, description):
+    """Queue a temporary file for removal so the response is not held up by disk I/O"""
+    if path:
+        cleanup_executor.submit(remove_file, path, description)
+
+def stream_file(path):
+    """Yield a file's contents in UPLOAD_CHUNK_SIZE pieces"""
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(UPLOAD_CHUNK_SIZE), b''):
+            yield chunk
+
+def audio_cache_key(audio_path, instrument_name):
+    """SHA-256 of the audio bytes plus the instrument, which changes the MIDI program"""
+    # Hash straight out of the page cache the upload was just written to,
+    # rather than copying it through read() buffers
+    with open(audio_path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            digest = hashlib.sha256()
+        else:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                digest = hashlib.sha256(mapped)
+    digest.update(str(instrument_name).encode('utf-8'))
+    return digest.hexdigest()
+
+def get_cached_midi(cache_key):
+    """Return the cached MIDI filename for cache_key if it is still on disk"""
+    with midi_cache_lock:
+        filename = midi_cache.get(cache_key)
+        if filename is None:
+            return None
+        try:
+            # Restart the file's retention period, so sweep_stale_files can't
+            # delete it right after it has been handed out again
+            os.utime(os.path.join(UPLOAD_FOLDER, filename))
+        except OSError:
+            # Already swept
+            del midi_cache[cache_key]
+            return None
+        midi_cache.move_to_end(cache_key)
+        return filename
+
+def cache_midi(cache_key, filename):
+    """Remember filename for cache_key, evicting the least recently used entry"""
+    with midi_cache_lock:
+        midi_cache[cache_key] = filename
+        midi_cache.move_to_end(cache_key)
+        while len(midi_cache) > MIDI_CACHE_SIZE:
+            midi_cache.popitem(last=False)
+
+def run_transcription(temp_audio_path, output_prefix, instrument_name):
+    """
+    Transcribe a saved audio file and place the resulting MIDI in UPLOAD_FOLDER
+    
+    Args:
+        temp_audio_path (str): Path to the uploaded audio file
+        output_prefix (str): Unique "<timestamp>_<uuid>" the output is named after
+        instrument_name (str): Name of the instrument to set in the MIDI
+        
+    Returns:
+        str: Filename of the MIDI file inside UPLOAD_FOLDER
+        
+    Raises:
+        TranscriptionError: If no MIDI file was produced
+    """
+    cache_key = audio_cache_key(temp_audio_path, instrument_name)
+    cached_filename = get_cached_midi(cache_key)
+    if cached_filename:
+        logger.info("Reusing cached MIDI file: %s", cached_filename)
+        return cached_filename
+    
     midi_files_to_cleanup = []
     
     try:
-        # Check if audio file was uploaded
-        if 'audio' not in request.files:
-            return jsonify({'error': 'No audio file provided'}), 400
+        # Write the MIDI files straight into UPLOAD_FOLDER so the served copy
+        # can be put in place with a rename instead of a copy
+        final_midi_filename = f"{output_prefix}_transcribed.mid"
+        final_midi_path = os.path.join(UPLOAD_FOLDER, final_midi_filename)
         
-        audio_file = request.files['audio']
-        if audio_file.filename == '':
-            return jsonify({'error': 'No audio file selected'}), 400
+        # Use transcribe_file method which returns list of MIDI files
+        output_files = transcriber.transcribe_file(temp_audio_path, output_midi=final_midi_path,
+                                                   instrument_name=instrument_name)
         
-        # Check if it's a valid audio file
-        if not audio_file.filename.lower().endswith('.wav'):
-            return jsonify({'error': 'Only .wav files are supported'}), 400
+        if not output_files:
+            raise TranscriptionError('Failed to generate MIDI files')
         
-        # Get instrument name from form data
-        instrument_name = request.form.get('instrument', 'Unknown')
-        if not instrument_name or instrument_name.strip() == '':
-            instrument_name = 'Unknown'
+        # The clean MIDI is always the last file returned
+        primary_midi_file = output_files[-1]
+        midi_files_to_cleanup = output_files
         
-        print(f"Processing audio file: {audio_file.filename}")
-        print(f"Instrument: {instrument_name}")
+        if not os.path.exists(primary_midi_file):
+            raise TranscriptionError('Generated MIDI file not found')
         
-        # Save the uploaded file to a temporary location
-        timestamp = int(time.time() * 1000)
-        temp_audio_path = os.path.join(tempfile.gettempdir(), f"{timestamp}_audio.wav")
+        logger.debug("Generated MIDI file: %s", primary_midi_file)
+        
+        # Same directory, so this is a single rename syscall
+        os.replace(primary_midi_file, final_midi_path)
+        logger.info("MIDI file saved to: %s", final_midi_path)
         
+        cache_midi(cache_key, final_midi_filename)
+        return final_midi_filename
+    finally:
+        # Clean up intermediate MIDI files
+        for midi_file in midi_files_to_cleanup:
+            remove_file_later(midi_file, 'MIDI file')
+        # and the denoised audio transcribe_file wrote next to the upload
+        # (see AudioToMIDITranscriber.reduce_noise)
+        noise_reduced_path = f"{os.path.splitext(temp_audio_path)[0]}_noise_reduced.wav"
+        remove_file_later(noise_reduced_path, 'noise-reduced audio file')
+
+def job_path(job_id):
+    """Path of the on-disk state record for a transcription job"""
+    return os.path.join(JOBS_FOLDER, f"{job_id}.json")
+
+def write_job(job_id, **fields):
+    """
+    Persist a transcription job record
+    
+    Records live on disk rather than in memory so that every server worker
+    can answer status requests for jobs started by another worker.
+    """
+    record = {'job_id': job_id, 'updated_at': time.time(), **fields}
+    tmp_path = f"{job_path(job_id)}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(record, f)
+    os.replace(tmp_path, job_path(job_id))
+
+def read_job(job_id):
+    """Load a transcription job record, or None if it does not exist"""
+    try:
+        with open(job_path(job_id)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def worker_alive(pid):
+    """Whether the server worker with this pid is still running (workers share one host)"""
+    if pid is None:
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+def prune_jobs():
+    """
+    Delete finished job records that have not been updated within
+    JOB_RETENTION_SECONDS, and mark unfinished ones that have not been
+    updated within JOB_TIMEOUT_SECONDS as failed if their worker is gone
+    """
+    now = time.time()
+    cutoff = now - min(JOB_RETENTION_SECONDS, JOB_TIMEOUT_SECONDS)
+    for entry in os.scandir(JOBS_FOLDER):
         try:
-            audio_file.save(temp_audio_path)
-            print(f"Saved audio file: {temp_audio_path}")
-            
-            # Verify file was saved and has content
-            if not os.path.exists(temp_audio_path) or os.path.getsize(temp_audio_path) == 0:
-                return jsonify({
-                    'success': False,
-                    'error': 'Failed to save audio file or file is empty'
-                }), 400
-            
-            print(f"Audio file size: {os.path.getsize(temp_audio_path)} bytes")
+            mtime = entry.stat().st_mtime
+            # Only records old enough to need attention are read
+            if mtime >= cutoff:
+                continue
             
-        except Exception as e:
-            return jsonify({
-                'success': False,
-                'error': 'Failed to save audio file',
-                'details': str(e)
-            }), 400
+            job_id, extension = os.path.splitext(entry.name)
+            job = read_job(job_id) if extension == '.json' else None
+            if job is None or job.get('status') in (JOB_COMPLETED, JOB_FAILED):
+                # Finished, unreadable, or a temp file from an interrupted write_job
+                if mtime < now - JOB_RETENTION_SECONDS:
+                    os.remove(entry.path)
+            elif mtime < now - JOB_TIMEOUT_SECONDS and not worker_alive(job.get('worker')):
+                logger.warning("Job %s was abandoned while %s", job_id, job.get('status'))
+                write_job(job_id, status=JOB_FAILED, error='Transcription was interrupted, please try again')
+        except OSError:
+            pass
+
+def sweep_stale_files():
+    """Delete files in UPLOAD_FOLDER and leftover temp audio older than UPLOAD_RETENTION_SECONDS"""
+    cutoff = time.time() - UPLOAD_RETENTION_SECONDS
+    stale_paths = []
+    for folder, suffixes in ((UPLOAD_FOLDER, None), (AUDIO_TEMP_DIR, TEMP_AUDIO_SUFFIXES)):
+        for entry in os.scandir(folder):
+            try:
+                if (entry.is_file() and entry.stat().st_mtime < cutoff
+                        and (suffixes is None or entry.name.endswith(suffixes))):
+                    stale_paths.append(entry.path)
+            except OSError:
+                pass
+    
+    for path in stale_paths:
+        remove_file(path, 'stale file')
+    prune_jobs()
+
+def sweep_stale_files_forever():
+    """Body of the background sweeper thread"""
+    while True:
+        time.sleep(SWEEP_INTERVAL_SECONDS)
+        try:
+            sweep_stale_files()
+        except Exception:
+            logger.exception("Stale file sweep failed")
+
+threading.Thread(target=sweep_stale_files_forever, name='stale-file-sweeper', daemon=True).start()
+
+def process_transcription_job(job_id, temp_audio_path, timestamp, instrument_name):
+    """Worker body for a queued transcription job"""
+    job = read_job(job_id)
+    if job is not None and job.get('status') == JOB_FAILED:
+        # prune_jobs already gave up on it and told the client so
+        logger.warning("Skipping job %s, it was already marked failed", job_id)
+        remove_file(temp_audio_path, 'temporary audio file')
+        return
+    
+    # Also refreshes the record's mtime, which prune_jobs goes by
+    write_job(job_id, status=JOB_PROCESSING, worker=os.getpid())
+    try:
+        final_midi_filename = run_transcription(temp_audio_path, f"{timestamp}_{job_id}", instrument_name)
+        write_job(job_id, status=JOB_COMPLETED, midiPath=final_midi_filename)
+    except TranscriptionError as e:
+        logger.warning("Job %s failed: %s", job_id, e)
+        write_job(job_id, status=JOB_FAILED, error=str(e))
+    except Exception as e:
+        logger.exception("Job %s failed", job_id)
+        write_job(job_id, status=JOB_FAILED, error='Transcription failed', details=str(e))
+    finally:
+        remove_file(temp_audio_path, 'temporary audio file')
+
+@app.route('/api/transcribe-single', methods=['POST'])
+def transcribe_single():
+    """
+    Route for spotify_transcriber.py functionality - single audio file to MIDI conversion
+    Expects a .wav audio file in the request
+    Converts to MIDI and returns the MIDI file directly
+    """
+    if request_too_large():
+        abort(413)
+    
+    temp_audio_path = None
+    
+    try:
+        # Save the uploaded file to a temporary location
+        # Named by a uuid as well, so requests in the same millisecond can't collide
+        output_prefix = f"{int(time.time() * 1000)}_{uuid.uuid4().hex}"
+        temp_audio_path = os.path.join(AUDIO_TEMP_DIR, f"{output_prefix}_audio.wav")
         
-        # Create transcriber and process the file
-        transcriber = AudioToMIDITranscriber()
+        instrument_name, error_response = receive_audio_upload(temp_audio_path)
+        if error_response:
+            return error_response
         
         try:
-            # Use transcribe_file method which returns list of MIDI files
-            output_files = transcriber.transcribe_file(temp_audio_path, instrument_name=instrument_name)
+            final_midi_filename = run_transcription(temp_audio_path, output_prefix, instrument_name)
             
-            if output_files and len(output_files) > 0:
-                # Use the clean MIDI file (second one) if available, otherwise use the first
-                primary_midi_file = output_files[1] if len(output_files) > 1 else output_files[0]
-                midi_files_to_cleanup = output_files
-                
-                if os.path.exists(primary_midi_file):
-                    print(f"Generated MIDI file: {primary_midi_file}")
-                    
-                    # Move the MIDI file to the uploads directory for serving
-                    final_midi_filename = f"{timestamp}_transcribed.mid"
-                    final_midi_path = os.path.join(UPLOAD_FOLDER, final_midi_filename)
-                    
-                    # Copy the file to uploads directory
-                    shutil.copy2(primary_midi_file, final_midi_path)
-                    print(f"MIDI file saved to: {final_midi_path}")
-                    
-                    # Return JSON response with the file path
-                    return jsonify({
-                        'success': True,
-                        'message': 'MIDI file generated successfully',
-                        'midiPath': final_midi_filename
-                    })
-                else:
-                    return jsonify({
-                        'success': False,
-                        'error': 'Generated MIDI file not found'
-                    }), 500
-            else:
-                return jsonify({
-                    'success': False,
-                    'error': 'Failed to generate MIDI files'
-                }), 500
-                
+            # Return JSON response with the file path
+            return jsonify({
+                'success': True,
+                'message': 'MIDI file generated successfully',
+                'midiPath': final_midi_filename
+            })
+        except TranscriptionError as e:
+            return jsonify({
+                'success': False,
+                'error': str(e)
+            }), 500
         except Exception as e:
-            print(f"Error during transcription: {str(e)}")
+            logger.exception("Error during transcription")
             return jsonify({
                 'success': False,
                 'error': 'Transcription failed',
                 'details': str(e)
             }), 500
-        finally:
-            transcriber.cleanup()
     
     except Exception as e:
-        print(f"Error in transcribe_single: {str(e)}")
+        logger.exception("Error in transcribe_single")
         return jsonify({
             'success': False,
             'error': 'Failed to process audio file',
@@ -178,22 +597,69 @@ def transcribe_single():
         }), 500
     finally:
         # Clean up temporary files
-        if temp_audio_path and os.path.exists(temp_audio_path):
-            try:
-                os.remove(temp_audio_path)
-                print(f"Cleaned up temporary audio file: {temp_audio_path}")
-            except Exception as e:
-                print(f"Warning: Could not remove temporary audio file {temp_audio_path}: {e}")
+        remove_file_later(temp_audio_path, 'temporary audio file')
+
+#ROUTE THAT IS ACTUALLY USED 
+@app.route('/api/jobs', methods=['POST'])
+def create_transcription_job():
+    """
+    Queue a single audio file for MIDI conversion
+    Accepts the same form data as /api/transcribe-single but returns immediately
+    with a job id that can be polled at /api/jobs/<job_id>
+    """
+    if request_too_large():
+        abort(413)
+    
+    temp_audio_path = None
+    
+    try:
+        timestamp = int(time.time() * 1000)
+        job_id = uuid.uuid4().hex
+        temp_audio_path = os.path.join(AUDIO_TEMP_DIR, f"{timestamp}_{job_id}_audio.wav")
         
-        # Clean up MIDI files after sending
-        for midi_file in midi_files_to_cleanup:
-            if os.path.exists(midi_file):
-                try:
-                    os.remove(midi_file)
-                    print(f"Cleaned up MIDI file: {midi_file}")
-                except Exception as e:
-                    print(f"Warning: Could not remove MIDI file {midi_file}: {e}")
+        instrument_name, error_response = receive_audio_upload(temp_audio_path)
+        if error_response:
+            remove_file_later(temp_audio_path, 'temporary audio file')
+            return error_response
+        
+        prune_jobs()
+        write_job(job_id, status=JOB_QUEUED, worker=os.getpid())
+        job_executor.submit(process_transcription_job, job_id, temp_audio_path, timestamp, instrument_name)
+        
+        return jsonify({'job_id': job_id, 'status': JOB_QUEUED}), 202
+    
+    except Exception as e:
+        logger.exception("Error in create_transcription_job")
+        remove_file_later(temp_audio_path, 'temporary audio file')
+        return jsonify({
+            'success': False,
+            'error': 'Failed to queue audio file',
+            'details': str(e)
+        }), 500
 
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def get_transcription_job(job_id):
+    """Return the state of a queued transcription job"""
+    job = read_job(secure_filename(job_id))
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(job)
+
+@app.route('/api/jobs/<job_id>/midi', methods=['GET'])
+def download_transcription_job(job_id):
+    """Download the MIDI file produced by a completed transcription job"""
+    job = read_job(secure_filename(job_id))
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    if job.get('status') != JOB_COMPLETED:
+        return jsonify({'error': 'Job has not completed', 'status': job.get('status')}), 409
+    
+    midi_path = os.path.join(UPLOAD_FOLDER, job['midiPath'])
+    if not os.path.exists(midi_path):
+        return jsonify({'error': 'File not found'}), 404
+    return send_file(midi_path, mimetype='audio/midi', as_attachment=True,
+                     download_name=job['midiPath'], conditional=True,
+                     max_age=SERVED_FILE_MAX_AGE)
 
 
 #ROUTE THAT IS ACTUALLY USED 
@@ -203,6 +669,11 @@ def combine_midi():
     """
     Route for combining multiple existing MIDI files into a single multi-track MIDI file
     """
+    if request_too_large():
+        abort(413)
+    
+    file_paths = []
+    
     try:
         # Check if any files were uploaded
         if not request.files:
@@ -210,7 +681,6 @@ def combine_midi():
         
         # Get all uploaded files
         uploaded_files = []
-        file_paths = []
         file_names = []
         timestamp = int(time.time() * 1000)
         
@@ -219,38 +689,42 @@ def combine_midi():
                 if not allowed_file(file.filename):
                     return jsonify({'error': f'File type not allowed for {file.filename}. Use MID or MIDI'}), 400
                 
-                # Save the file
-                filename = secure_filename(file.filename)
-                file_path = os.path.join(UPLOAD_FOLDER, f"{timestamp}_{key}_{filename}")
-                file.save(file_path)
+                # Save the file under a server-generated name; the client's
+                # filename and field name are only used for display
+                file_path = os.path.join(UPLOAD_FOLDER, f"{timestamp}_{uuid.uuid4().hex}.mid")
+                file.save(file_path, buffer_size=FILE_COPY_BUFFER_SIZE)
                 
                 uploaded_files.append(file)
                 file_paths.append(file_path)
-                file_names.append(filename)
+                file_names.append(file.filename)
         
         if len(uploaded_files) == 0:
             return jsonify({'error': 'No valid files uploaded'}), 400
         
-        print(f"Processing {len(uploaded_files)} MIDI files for combination")
-        for i, name in enumerate(file_names):
-            print(f"  File {i+1}: {name}")
-        
-        # Create dual instrument recorder and process files
-        recorder = DualInstrumentRecorder()
+        logger.info("Combining %d MIDI files: %s", len(uploaded_files), ', '.join(file_names))
         
         try:
             # Combine existing MIDI files directly (no transcription)
-            combined_midi_file = recorder.combine_existing_midi_files(file_paths, list(request.files.keys()))
+            # Written inside UPLOAD_FOLDER under a unique name, so concurrent
+            # requests in the same second don't share a file
+            combined_midi_file = recorder.combine_existing_midi_files(
+                file_paths, list(request.files.keys()),
+                output_path=os.path.join(UPLOAD_FOLDER, f"{timestamp}_{uuid.uuid4().hex}_combined.mid"))
             
             if combined_midi_file and os.path.exists(combined_midi_file):
                 # Return the combined MIDI file directly
                 download_name = f"{timestamp}_combined.mid"
-                return send_file(
-                    combined_midi_file,
-                    as_attachment=True,
-                    download_name=download_name,
-                    mimetype='audio/midi'
+                response = Response(
+                    stream_file(combined_midi_file),
+                    mimetype='audio/midi',
+                    headers={
+                        'Content-Disposition': f'attachment; filename="{download_name}"',
+                        'Content-Length': str(os.path.getsize(combined_midi_file)),
+                    }
                 )
+                # The combined file is only needed until the body has been sent
+                response.call_on_close(lambda: remove_file_later(combined_midi_file, 'combined MIDI file'))
+                return response
             else:
                 return jsonify({
                     'success': False,
@@ -258,22 +732,24 @@ def combine_midi():
                 }), 500
                 
         except Exception as e:
-            print(f"Error during multi transcription: {str(e)}")
+            logger.exception("Error during multi transcription")
             return jsonify({
                 'success': False,
                 'error': 'Multi transcription failed',
                 'details': str(e)
             }), 500
-        finally:
-            recorder.transcriber.cleanup()
     
     except Exception as e:
-        print(f"Error in combine_midi: {str(e)}")
+        logger.exception("Error in combine_midi")
         return jsonify({
             'success': False,
             'error': 'Failed to process multiple instrument files',
             'details': str(e)
         }), 500
+    finally:
+        # The uploaded tracks have been read into the combined file by now
+        for file_path in file_paths:
+            remove_file_later(file_path, 'uploaded MIDI file')
 
 @app.route('/uploads/<filename>')
 def serve_file(filename):
@@ -282,19 +758,22 @@ def serve_file(filename):
         file_path = os.path.join(UPLOAD_FOLDER, filename)
         if os.path.exists(file_path):
             # Set appropriate content type based on file extension
-            mimetype = None
-            if filename.lower().endswith('.mid') or filename.lower().endswith('.midi'):
-                mimetype = 'audio/midi'
-            elif filename.lower().endswith('.wav'):
-                mimetype = 'audio/wav'
-            elif filename.lower().endswith('.mp3'):
-                mimetype = 'audio/mpeg'
+            mimetype = SERVED_MIMETYPES.get(os.path.splitext(filename)[1].lower())
             
-            return send_file(file_path, mimetype=mimetype)
+            if ACCEL_REDIRECT_PREFIX:
+                return Response(b'', headers={
+                    'X-Accel-Redirect': f"{ACCEL_REDIRECT_PREFIX.rstrip('/')}/{filename}",
+                    'Content-Type': mimetype or 'application/octet-stream',
+                    'Cache-Control': f'public, max-age={SERVED_FILE_MAX_AGE}',
+                })
+            
+            # conditional=True answers If-None-Match/If-Modified-Since with 304
+            return send_file(file_path, mimetype=mimetype, conditional=True,
+                             etag=True, max_age=SERVED_FILE_MAX_AGE)
         else:
             return jsonify({'error': 'File not found'}), 404
-    except Exception as e:
-        print(f"Error serving file {filename}: {str(e)}")
+    except Exception:
+        logger.exception("Error serving file %s", filename)
         return jsonify({'error': 'Failed to serve file'}), 500
 
 # Error handlers
@@ -317,10 +796,14 @@ if __name__ == '__main__':
    
     print(f"Health check: http://localhost:{PORT}/api/health")
     print("\nAvailable routes:")
-    print(f"  POST /api/transcribe-single - Single audio file to MIDI (outputs to Vercel blob storage)")
+    print(f"  POST /api/transcribe-single - Single audio file to MIDI (served from /uploads)")
+    print(f"  POST /api/jobs              - Queue single audio file to MIDI, returns a job id")
+    print(f"  GET  /api/jobs/<job_id>     - Poll a queued transcription job")
+    print(f"  GET  /api/jobs/<job_id>/midi - Download a completed job's MIDI file")
     print(f"  POST /api/transcribe-vocals  - Vocals-only processing") 
     print(f"  POST /api/combine-midi      - Combine multiple audio files into single MIDI")
     print(f"  GET  /api/health            - Health check")
     print(f"  GET  /uploads/<filename>    - Serve generated files")
     
-    app.run(host='0.0.0.0', port=PORT, debug=True)
+    # Local development only; production runs under gunicorn (see gunicorn.conf.py)
+    app.run(host='0.0.0.0', port=PORT, debug=os.getenv('FLASK_DEBUG') == '1')
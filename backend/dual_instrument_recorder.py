@@ -6,31 +6,38 @@ then combines into a single MIDI file for GarageBand import
 
 import os
 import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from itertools import chain
 from spotify_transcriber import AudioToMIDITranscriber
 import pretty_midi
 
+# Upper bound on files transcribed at the same time
+MAX_TRANSCRIPTION_THREADS = 4
+
 class DualInstrumentRecorder:
-    def __init__(self, sample_rate=44100):
+    def __init__(self, sample_rate=44100, transcriber=None):
         """
         Initialize the dual instrument recorder
         
         Args:
             sample_rate (int): Audio sample rate (Hz)
+            transcriber (AudioToMIDITranscriber): Existing transcriber to share,
+                e.g. the server's; a new one is created if omitted
         """
         self.sample_rate = sample_rate
-        self.transcriber = AudioToMIDITranscriber(sample_rate=sample_rate)
+        self.transcriber = transcriber or AudioToMIDITranscriber(sample_rate=sample_rate)
         
-    def record_instrument(self, instrument_name, duration=15):
+    def record_instrument_audio(self, instrument_name, duration=15):
         """
-        Record a single instrument and convert to MIDI
+        Record a single instrument to a WAV file without transcribing it
         
         Args:
             instrument_name (str): Name of the instrument (e.g., "piano", "bass")
             duration (int): Recording duration in seconds
             
         Returns:
-            tuple: (audio_file, midi_data, note_events)
+            str: Path to the recorded audio file
         """
         print(f"\n=== Recording {instrument_name.upper()} ===")
         print(f"Recording for {duration} seconds...")
@@ -41,7 +48,20 @@ class DualInstrumentRecorder:
         audio_file = f"{instrument_name}_{timestamp}.wav"
         
         # Use the transcriber's record_audio method
-        recorded_file = self.transcriber.record_audio(duration, audio_file)
+        return self.transcriber.record_audio(duration, audio_file)
+    
+    def record_instrument(self, instrument_name, duration=15):
+        """
+        Record a single instrument and convert to MIDI
+        
+        Args:
+            instrument_name (str): Name of the instrument (e.g., "piano", "bass")
+            duration (int): Recording duration in seconds
+            
+        Returns:
+            tuple: (audio_file, midi_data, note_events)
+        """
+        recorded_file = self.record_instrument_audio(instrument_name, duration)
         
         # Skip noise reduction - transcribe directly from original audio
         print("Skipping noise reduction - using original audio for transcription")
@@ -55,6 +75,25 @@ class DualInstrumentRecorder:
         
         return recorded_file, midi_data, note_events
     
+    def detect_pitches_concurrently(self, audio_files):
+        """
+        Run pitch detection on several independent audio files at once.
+        Basic Pitch spends most of its time in native TensorFlow code that
+        releases the GIL, so the files overlap well on a thread pool.
+        
+        Args:
+            audio_files (list): Paths to audio files
+            
+        Returns:
+            list: (midi_data, note_events) tuples in the same order as audio_files
+        """
+        if len(audio_files) <= 1:
+            return [self.transcriber.detect_pitches_chunked(audio_file) for audio_file in audio_files]
+        
+        max_workers = min(len(audio_files), MAX_TRANSCRIPTION_THREADS)
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            return list(executor.map(self.transcriber.detect_pitches_chunked, audio_files))
+    
     def combine_midi_tracks(self, piano_midi, bass_midi, output_file):
         """
         Combine piano and bass MIDI data into a single file with separate tracks
@@ -74,9 +113,8 @@ class DualInstrumentRecorder:
             piano_track = pretty_midi.Instrument(program=0)  # Acoustic Grand Piano program
             piano_track.name = "Piano"
             
-            for instrument in piano_midi.instruments:
-                for note in instrument.notes:
-                    piano_track.notes.append(note)
+            piano_track.notes.extend(chain.from_iterable(
+                instrument.notes for instrument in piano_midi.instruments))
             
             combined_midi.instruments.append(piano_track)
             print(f"Added piano track with {len(piano_track.notes)} notes")
@@ -86,9 +124,8 @@ class DualInstrumentRecorder:
             bass_track = pretty_midi.Instrument(program=32)  # Acoustic Bass program
             bass_track.name = "Bass"
             
-            for instrument in bass_midi.instruments:
-                for note in instrument.notes:
-                    bass_track.notes.append(note)
+            bass_track.notes.extend(chain.from_iterable(
+                instrument.notes for instrument in bass_midi.instruments))
             
             combined_midi.instruments.append(bass_track)
             print(f"Added bass track with {len(bass_track.notes)} notes")
@@ -154,11 +191,9 @@ class DualInstrumentRecorder:
                 )
                 
                 # Add all notes from the MIDI data to this track
-                note_count = 0
-                for instrument in midi_data.instruments:
-                    for note in instrument.notes:
-                        track.notes.append(note)
-                        note_count += 1
+                track.notes.extend(chain.from_iterable(
+                    instrument.notes for instrument in midi_data.instruments))
+                note_count = len(track.notes)
                 
                 combined_midi.instruments.append(track)
                 print(f"Added {instrument_name} track with {note_count} notes (Program: {program})")
@@ -171,13 +206,15 @@ class DualInstrumentRecorder:
         
         return combined_midi
     
-    def combine_existing_midi_files(self, midi_file_paths, instrument_names=None):
+    def combine_existing_midi_files(self, midi_file_paths, instrument_names=None, output_path=None):
         """
         Combine existing MIDI files into a single multi-track MIDI file (no transcription).
         
         Args:
             midi_file_paths (list[str]): Paths to MIDI files (.mid/.midi)
             instrument_names (list[str] | None): Optional names for tracks
+            output_path (str | None): Where to write the combined file; defaults
+                to a timestamped name in the current directory
         Returns:
             str: Path to combined MIDI file
         """
@@ -196,21 +233,25 @@ class DualInstrumentRecorder:
                 loaded_midis.append(pretty_midi.PrettyMIDI(path))
 
             # Build combined file
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            combined_midi_file = f"multi_combined_{timestamp}.mid"
+            combined_midi_file = output_path
+            if combined_midi_file is None:
+                timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+                combined_midi_file = f"multi_combined_{timestamp}.mid"
             self.combine_multiple_midi_tracks(loaded_midis, instrument_names, combined_midi_file)
             return combined_midi_file
         except Exception as e:
             print(f"❌ Error combining existing MIDI files: {e}")
             return None
 
-    def process_dual_files(self, piano_file, bass_file):
+    def process_dual_files(self, piano_file, bass_file, output_path=None):
         """
         Process existing piano and bass audio files, then combine into single MIDI file
         
         Args:
             piano_file (str): Path to piano audio file
             bass_file (str): Path to bass audio file
+            output_path (str): Where to write the combined file; defaults to a
+                timestamped name in the current directory
             
         Returns:
             str: Path to combined MIDI file
@@ -227,21 +268,37 @@ class DualInstrumentRecorder:
             if not os.path.exists(bass_file):
                 raise FileNotFoundError(f"Bass file not found: {bass_file}")
             
-            # Process piano file
-            print(f"\n=== Processing Piano File ===")
+            # Process piano and bass files at the same time
+            print(f"\n=== Processing Piano and Bass Files ===")
             print(f"Piano file: {piano_file}")
-            piano_midi, piano_notes = self.transcriber.detect_pitches(piano_file)
-            print(f"✅ Piano processing complete! Notes detected: {len(piano_notes)}")
-            
-            # Process bass file
-            print(f"\n=== Processing Bass File ===")
             print(f"Bass file: {bass_file}")
-            bass_midi, bass_notes = self.transcriber.detect_pitches(bass_file)
-            print(f"✅ Bass processing complete! Notes detected: {len(bass_notes)}")
+            with ThreadPoolExecutor(max_workers=2) as executor:
+                piano_future = executor.submit(self.transcriber.detect_pitches_chunked, piano_file)
+                bass_future = executor.submit(self.transcriber.detect_pitches_chunked, bass_file)
+            
+            # A bad file only drops its own track
+            try:
+                piano_midi, piano_notes = piano_future.result()
+                print(f"✅ Piano processing complete! Notes detected: {len(piano_notes)}")
+            except Exception as e:
+                print(f"❌ Error processing piano file: {e}")
+                piano_midi, piano_notes = None, []
+            
+            try:
+                bass_midi, bass_notes = bass_future.result()
+                print(f"✅ Bass processing complete! Notes detected: {len(bass_notes)}")
+            except Exception as e:
+                print(f"❌ Error processing bass file: {e}")
+                bass_midi, bass_notes = None, []
+            
+            if piano_midi is None and bass_midi is None:
+                raise RuntimeError("Both piano and bass transcription failed")
             
             # Combine MIDI tracks
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            combined_midi_file = f"piano_bass_combined_{timestamp}.mid"
+            combined_midi_file = output_path
+            if combined_midi_file is None:
+                timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+                combined_midi_file = f"piano_bass_combined_{timestamp}.mid"
             
             combined_midi = self.combine_midi_tracks(piano_midi, bass_midi, combined_midi_file)
             
@@ -263,13 +320,15 @@ class DualInstrumentRecorder:
             print(f"❌ Error during processing: {e}")
             return None
 
-    def process_multiple_files(self, audio_files, instrument_names=None):
+    def process_multiple_files(self, audio_files, instrument_names=None, output_path=None):
         """
         Process multiple audio files and combine into single MIDI file
         
         Args:
             audio_files (list): List of paths to audio files
             instrument_names (list): Optional list of instrument names corresponding to files
+            output_path (str): Where to write the combined file; defaults to a
+                timestamped name in the current directory
             
         Returns:
             str: Path to combined MIDI file
@@ -288,24 +347,28 @@ class DualInstrumentRecorder:
                 if not os.path.exists(audio_file):
                     raise FileNotFoundError(f"{instrument_names[i]} file not found: {audio_file}")
             
-            # Process all files
+            # Process all files concurrently
+            print(f"\n=== Processing {len(audio_files)} Files ===")
+            for i, audio_file in enumerate(audio_files):
+                instrument_name = instrument_names[i] if i < len(instrument_names) else f"Instrument_{i+1}"
+                print(f"{instrument_name} file: {audio_file}")
+            
+            results = self.detect_pitches_concurrently(audio_files)
             midi_data_list = []
             note_counts = []
             
-            for i, audio_file in enumerate(audio_files):
+            for i, (midi_data, notes) in enumerate(results):
                 instrument_name = instrument_names[i] if i < len(instrument_names) else f"Instrument_{i+1}"
-                print(f"\n=== Processing {instrument_name} File ===")
-                print(f"{instrument_name} file: {audio_file}")
-                
-                midi_data, notes = self.transcriber.detect_pitches(audio_file)
                 midi_data_list.append(midi_data)
                 note_counts.append(len(notes))
                 
                 print(f"✅ {instrument_name} processing complete! Notes detected: {len(notes)}")
             
             # Combine MIDI tracks
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            combined_midi_file = f"multi_combined_{timestamp}.mid"
+            combined_midi_file = output_path
+            if combined_midi_file is None:
+                timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+                combined_midi_file = f"multi_combined_{timestamp}.mid"
             
             combined_midi = self.combine_multiple_midi_tracks(midi_data_list, instrument_names, combined_midi_file)
             
@@ -342,15 +405,25 @@ class DualInstrumentRecorder:
             print("The MIDI file will have two tracks that can be layered in GarageBand.")
             print()
             
-            # Record piano
-            piano_audio, piano_midi, piano_notes = self.record_instrument("piano", duration)
-            
-            # Wait between recordings
-            print(f"\n⏳ Waiting 5 seconds before bass recording...")
-            time.sleep(5)
+            with ThreadPoolExecutor(max_workers=1) as executor:
+                # Record piano, then transcribe it in the background while the
+                # bass is being recorded (skipping noise reduction)
+                piano_audio = self.record_instrument_audio("piano", duration)
+                piano_future = executor.submit(self.transcriber.detect_pitches_chunked, piano_audio)
+                
+                # Wait between recordings
+                print(f"\n⏳ Waiting 5 seconds before bass recording...")
+                time.sleep(5)
+                
+                # Record and transcribe bass
+                bass_audio = self.record_instrument_audio("bass", duration)
+                print(f"\n=== Transcribing Bass ===")
+                bass_midi, bass_notes = self.transcriber.detect_pitches_chunked(bass_audio)
+                
+                piano_midi, piano_notes = piano_future.result()
             
-            # Record bass
-            bass_audio, bass_midi, bass_notes = self.record_instrument("bass", duration)
+            print(f"✅ Piano notes detected: {len(piano_notes)}")
+            print(f"✅ Bass notes detected: {len(bass_notes)}")
             
             # Combine MIDI tracks
             timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
@@ -375,8 +448,6 @@ class DualInstrumentRecorder:
         except Exception as e:
             print(f"❌ Error during recording: {e}")
             return None
-        finally:
-            self.transcriber.cleanup()
 
 def main():
     """Main function"""
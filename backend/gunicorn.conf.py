@@ -0,0 +1,21 @@
+"""
+Gunicorn configuration for the audio-to-MIDI Flask server.
+Run from the backend directory with: gunicorn -c gunicorn.conf.py app:app
+"""
+
+import os
+
+bind = f"0.0.0.0:{os.getenv('PORT', '3001')}"
+
+# Threaded workers rather than gevent: transcription jobs run on a thread pool
+# inside each worker, and gevent's monkey patching would turn those threads
+# into greenlets that block the whole worker while inference runs.
+worker_class = 'gthread'
+# Every worker loads its own Basic Pitch model and its own job and cleanup
+# pools, and each job already keeps several cores busy, so start a small fixed
+# number; raise WEB_CONCURRENCY on hosts with memory and cores to spare
+workers = int(os.getenv('WEB_CONCURRENCY', '2'))
+threads = int(os.getenv('GUNICORN_THREADS', '4'))
+
+# Synchronous /api/transcribe-single requests can take minutes on long audio
+timeout = 300
@@ -5,7 +5,6 @@ Takes in WAV files and returns the hardcoded Ellie Goulding MIDI file.
 """
 
 import os
-import shutil
 from flask import Flask, request, jsonify, send_file
 from flask_cors import CORS
 from werkzeug.utils import secure_filename
@@ -19,9 +18,35 @@ UPLOAD_FOLDER = 'uploads'
 MOCK_MIDI_FILE = 'ellie_goulding_vocals_20250927_133544.mid'
 PORT = 3001
 
+# Candidate WAV files to return as the "combined" audio; the first one found is used
+MOCK_WAV_OPTIONS = [
+    'Lights - Vocals Only (Acapella) _ Ellie Goulding.wav',
+    'Lights - Vocals Only (Acapella) _ Ellie Goulding_noise_reduced.wav',
+    'bass_20250927_160637.wav',
+    'piano_20250927_160621.wav'
+]
+
 # Ensure upload directory exists
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 
+def read_mock_file(path):
+    """Read a mock file into memory, or return None if it doesn't exist"""
+    if not os.path.exists(path):
+        return None
+    with open(path, 'rb') as f:
+        return f.read()
+
+def write_mock_file(data, path):
+    """Write cached mock file contents to path"""
+    with open(path, 'wb') as f:
+        f.write(data)
+
+# Every response hands back the same files, so read them once at startup
+# instead of copying them from disk on each request
+MOCK_MIDI_BYTES = read_mock_file(MOCK_MIDI_FILE)
+MOCK_WAV_FILE = next((wav_file for wav_file in MOCK_WAV_OPTIONS if os.path.exists(wav_file)), None)
+MOCK_WAV_BYTES = read_mock_file(MOCK_WAV_FILE) if MOCK_WAV_FILE else None
+
 @app.route('/api/health', methods=['GET'])
 def health_check():
     """Health check endpoint"""
@@ -57,9 +82,9 @@ def convert_to_midi():
         midi_filename = f"midi_{timestamp}.mid"
         midi_path = os.path.join(UPLOAD_FOLDER, midi_filename)
         
-        # Copy the hardcoded Ellie Goulding MIDI file to the new filename
-        if os.path.exists(MOCK_MIDI_FILE):
-            shutil.copy2(MOCK_MIDI_FILE, midi_path)
+        # Write the hardcoded Ellie Goulding MIDI file to the new filename
+        if MOCK_MIDI_BYTES is not None:
+            write_mock_file(MOCK_MIDI_BYTES, midi_path)
             print(f"Mock MIDI file created: {midi_filename}")
             
             return jsonify({
@@ -104,35 +129,19 @@ def combine_midi():
         combined_midi_path = os.path.join(UPLOAD_FOLDER, combined_midi_filename)
         combined_wav_path = os.path.join(UPLOAD_FOLDER, combined_wav_filename)
         
-        # Find available hardcoded files to use as mock combined result
-        hardcoded_midi = MOCK_MIDI_FILE  # ellie_goulding_vocals_20250927_133544.mid
-        hardcoded_wav_options = [
-            'Lights - Vocals Only (Acapella) _ Ellie Goulding.wav',
-            'Lights - Vocals Only (Acapella) _ Ellie Goulding_noise_reduced.wav',
-            'bass_20250927_160637.wav',
-            'piano_20250927_160621.wav'
-        ]
-        
-        # Find the first available WAV file
-        hardcoded_wav = None
-        for wav_file in hardcoded_wav_options:
-            if os.path.exists(wav_file):
-                hardcoded_wav = wav_file
-                break
-        
-        # Copy the hardcoded MIDI file as the "combined" result
-        if os.path.exists(hardcoded_midi):
-            shutil.copy2(hardcoded_midi, combined_midi_path)
+        # Write the hardcoded MIDI file as the "combined" result
+        if MOCK_MIDI_BYTES is not None:
+            write_mock_file(MOCK_MIDI_BYTES, combined_midi_path)
             print(f"Mock combined MIDI file created: {combined_midi_filename}")
         else:
             return jsonify({
                 'success': False,
-                'error': f'Mock MIDI file not found: {hardcoded_midi}'
+                'error': f'Mock MIDI file not found: {MOCK_MIDI_FILE}'
             }), 500
         
-        # Copy a hardcoded WAV file as the "combined" audio result
-        if hardcoded_wav and os.path.exists(hardcoded_wav):
-            shutil.copy2(hardcoded_wav, combined_wav_path)
+        # Write the hardcoded WAV file as the "combined" audio result
+        if MOCK_WAV_BYTES is not None:
+            write_mock_file(MOCK_WAV_BYTES, combined_wav_path)
             print(f"Mock combined WAV file created: {combined_wav_filename}")
         else:
             print("Warning: No hardcoded WAV file found, proceeding with MIDI only")
@@ -185,11 +194,12 @@ if __name__ == '__main__':
     print(f"Mock MIDI file: {MOCK_MIDI_FILE}")
     print(f"Health check: http://localhost:{PORT}/api/health")
     
-    # Check if the mock MIDI file exists
-    if os.path.exists(MOCK_MIDI_FILE):
+    # Check if the mock MIDI file was loaded
+    if MOCK_MIDI_BYTES is not None:
         print(f"✅ Mock MIDI file found: {MOCK_MIDI_FILE}")
     else:
         print(f"⚠️  Mock MIDI file not found: {MOCK_MIDI_FILE}")
         print("   The server will still run, but conversions will fail.")
+        print("   Restart the server once the file is in place.")
     
     app.run(host='0.0.0.0', port=PORT, debug=True)
@@ -9,34 +9,203 @@ import wave
 import numpy as np
 import tempfile
 import os
+import hashlib
+import shutil
 from basic_pitch import ICASSP_2022_MODEL_PATH
-from basic_pitch.inference import predict
+from basic_pitch.constants import AUDIO_SAMPLE_RATE
+from basic_pitch.inference import Model, predict
 import pretty_midi
 import argparse
 import time
 from datetime import datetime
 import noisereduce as nr
 import librosa
-import random
+import soundfile as sf
+import threading
+import queue
+from contextlib import nullcontext
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor
+
+# Audio longer than this is split into windows that are transcribed in parallel
+CHUNK_SECONDS = 30
+# Each window runs this far into the next one so notes at the seam aren't cut
+CHUNK_OVERLAP_SECONDS = 1
+MAX_CHUNK_WORKERS = 4
+
+# transcribe_live transcribes the recording in windows of this length while it
+# is still being captured (they overlap by CHUNK_OVERLAP_SECONDS as well)
+STREAM_WINDOW_SECONDS = 5
+# Each streamed window is denoised together with this much of the audio before
+# it (noisereduce's non-stationary time constant), so its noise estimate does
+# not start from scratch at every window edge
+STREAM_DENOISE_CONTEXT_SECONDS = 2
+
+# merge_windows treats same-pitch notes from neighbouring windows whose starts
+# are closer than this as one note detected twice
+NOTE_MATCH_SECONDS = 0.05
+
+# One row per detected note; detect_pitches returns its note events as a
+# structured array of these rather than a list of dicts
+NOTE_EVENT_DTYPE = np.dtype([('pitch', np.uint8), ('start', np.float64),
+                             ('end', np.float64), ('velocity', np.uint8)])
+
+# Settings passed to nr.reduce_noise. They are part of the noise-reduction
+# cache key too, so changing one here invalidates cached results.
+NOISE_REDUCTION_PARAMS = {
+    'prop_decrease': 0.5,  # Reduce noise by 50% (gentler)
+    'stationary': False,  # Better for voice recordings
+    # These are the CORRECT parameters for current versions:
+    'freq_mask_smooth_hz': 500,  # Frequency smoothing in Hz
+    'time_mask_smooth_ms': 50,   # Time smoothing in milliseconds
+    'n_std_thresh_stationary': 1.5,  # Threshold for noise detection
+}
+
+# Processes noisereduce may start for one call when running on the CPU. It
+# only splits clips longer than its 600000-sample chunk, and every server
+# worker would start its own, so this stays at 1 unless set (-1 = every core)
+NOISE_REDUCTION_JOBS = int(os.getenv('NOISE_REDUCTION_JOBS', '1'))
+
+# Where test_vocals_midi keeps noise-reduced audio between runs
+DEFAULT_NOISE_CACHE_DIR = os.path.expanduser('~/.cache/spotify_transcriber')
+
+# record_audio gives up if the microphone stream delivers nothing for this long
+INPUT_TIMEOUT_SECONDS = 2
+
+# TensorFlow and ONNX Runtime models can run predictions from several threads
+# at once; the TFLite interpreter and CoreML model cannot
+THREAD_SAFE_MODEL_TYPES = (Model.MODEL_TYPES.TENSORFLOW, Model.MODEL_TYPES.ONNX)
+
+# basic-pitch runs its CoreML model on the CPU only. Set this to 1 to let it
+# use the GPU and Neural Engine too; the Neural Engine computes in float16, so
+# the transcription can differ slightly from the CPU reference.
+COREML_ALL_COMPUTE_UNITS = os.getenv('COREML_ALL_COMPUTE_UNITS') == '1'
+
+# ONNX Runtime providers to try ahead of the CPU, in order of preference
+ONNX_ACCELERATED_PROVIDERS = ['CUDAExecutionProvider', 'CoreMLExecutionProvider']
+
+# Serializes predictions on models that aren't thread-safe. The model is shared
+# by every transcriber in the process (see load_basic_pitch_model), so the lock is too
+shared_predict_lock = threading.Lock()
+
+@lru_cache(maxsize=None)
+def load_basic_pitch_model():
+    """
+    Load the Basic Pitch model, using a GPU when the backend can. TensorFlow
+    picks up a GPU by itself, but basic-pitch pins its ONNX Runtime model to
+    the CPU, so that is reopened here; so is the CoreML model when
+    COREML_ALL_COMPUTE_UNITS is set.
+    
+    The model is loaded once per process and shared by every transcriber.
+    """
+    model = Model(ICASSP_2022_MODEL_PATH)
+    
+    if model.model_type == Model.MODEL_TYPES.COREML and COREML_ALL_COMPUTE_UNITS:
+        import coremltools as ct
+        model.model = ct.models.MLModel(str(ICASSP_2022_MODEL_PATH), compute_units=ct.ComputeUnit.ALL)
+    elif model.model_type == Model.MODEL_TYPES.ONNX:
+        import onnxruntime as ort
+        available = ort.get_available_providers()
+        accelerated = [provider for provider in ONNX_ACCELERATED_PROVIDERS if provider in available]
+        if accelerated:
+            model.model = ort.InferenceSession(str(ICASSP_2022_MODEL_PATH),
+                                               providers=accelerated + ['CPUExecutionProvider'])
+    
+    return model
+
+def noise_reduction_backend():
+    """
+    Pick how noisereduce should run: on a GPU through its torch backend when
+    torch is installed and sees one, otherwise on NOISE_REDUCTION_JOBS CPU
+    processes.
+    
+    Returns:
+        dict: Extra keyword arguments for nr.reduce_noise
+    """
+    try:
+        import torch
+    except ImportError:
+        return {'n_jobs': NOISE_REDUCTION_JOBS}
+    
+    if torch.cuda.is_available():
+        return {'use_torch': True, 'device': 'cuda'}
+    if torch.backends.mps.is_available():
+        return {'use_torch': True, 'device': 'mps'}
+    return {'n_jobs': NOISE_REDUCTION_JOBS}
+
+def note_events_from_notes(notes):
+    """
+    Build the NOTE_EVENT_DTYPE array describing a list of pretty_midi notes
+    
+    Args:
+        notes (list): pretty_midi.Note objects
+        
+    Returns:
+        np.ndarray: One row per note, in the same order
+    """
+    note_events = np.empty(len(notes), dtype=NOTE_EVENT_DTYPE)
+    note_events['pitch'] = np.fromiter((note.pitch for note in notes), dtype=np.uint8, count=len(notes))
+    note_events['start'] = np.fromiter((note.start for note in notes), dtype=np.float64, count=len(notes))
+    note_events['end'] = np.fromiter((note.end for note in notes), dtype=np.float64, count=len(notes))
+    note_events['velocity'] = np.fromiter((note.velocity for note in notes), dtype=np.uint8, count=len(notes))
+    return note_events
 
 class AudioToMIDITranscriber:
-    def __init__(self, sample_rate=44100, chunk_size=1024, channels=1):
+    def __init__(self, sample_rate=44100, chunk_size=1024, channels=1, noise_cache_dir=None):
         """
         Initialize the transcriber with audio parameters optimized for Basic Pitch
+        
+        If noise_cache_dir is given, noise-reduced audio is kept there and
+        reused when the same, unchanged file is reduced again.
         """
         self.sample_rate = sample_rate  # 44.1kHz is better for Basic Pitch
         self.chunk_size = chunk_size
         self.channels = channels
-        self.audio = pyaudio.PyAudio()
+        self.noise_cache_dir = noise_cache_dir
+        self._audio = None  # PortAudio instance, see the audio property
         self.is_recording = False
         
-    def record_audio(self, duration=10, output_file=None):
+        # Input stream kept open between recordings, the settings it was
+        # opened with (see get_input_stream), and the queue its callback fills
+        self.input_stream = None
+        self.input_stream_config = None
+        self.input_queue = queue.SimpleQueue()
+        
+        # Load the Basic Pitch model once; predict() would otherwise reload it
+        # from ICASSP_2022_MODEL_PATH on every call
+        self.basic_pitch_model = load_basic_pitch_model()
+        if self.basic_pitch_model.model_type in THREAD_SAFE_MODEL_TYPES:
+            self.predict_lock = nullcontext()
+        else:
+            self.predict_lock = shared_predict_lock
+        
+        self.noise_reduction_backend = noise_reduction_backend()
+        
+        # One generator for the velocity and timing jitter, rather than going
+        # through NumPy's global RandomState on every call
+        self.rng = np.random.default_rng()
+        
+    @property
+    def audio(self):
+        """
+        PortAudio instance, created on first use
+        
+        Initializing PortAudio enumerates every audio device, so file-only
+        transcription never pays for it.
+        """
+        if self._audio is None:
+            self._audio = pyaudio.PyAudio()
+        return self._audio
+    
+    def record_audio(self, duration=10, output_file=None, on_block=None):
         """
         Record audio from default microphone
         
         Args:
             duration (int): Recording duration in seconds
             output_file (str): Path to save recorded audio (optional)
+            on_block (callable): Called with each block of raw int16 frames
+                                 as soon as it is captured (optional)
             
         Returns:
             str: Path to recorded audio file
@@ -49,46 +218,129 @@ class AudioToMIDITranscriber:
         print(f"Recording for {duration} seconds...")
         print("Speak or play music into your microphone...")
         
-        # Open audio stream
-        stream = self.audio.open(
-            format=pyaudio.paInt16,
-            channels=self.channels,
-            rate=self.sample_rate,
-            input=True,
-            frames_per_buffer=self.chunk_size
-        )
+        # PortAudio hands captured buffers to _queue_input on its own thread;
+        # a fresh queue per take keeps stray buffers from the last one out
+        self.input_queue = queue.SimpleQueue()
+        stream = self.get_input_stream()
+        stream.start_stream()
         
-        frames = []
         self.is_recording = True
         
-        try:
-            for i in range(0, int(self.sample_rate / self.chunk_size * duration)):
-                if not self.is_recording:
-                    break
-                data = stream.read(self.chunk_size)
-                frames.append(data)
-                
-                # Show recording progress
-                progress = (i + 1) / (self.sample_rate / self.chunk_size * duration) * 100
-                print(f"\rRecording progress: {progress:.1f}%", end="", flush=True)
-        except KeyboardInterrupt:
-            print("\nRecording interrupted by user")
+        # Buffers arrive every chunk_size frames, but are written (and passed
+        # to on_block) a second at a time
+        frame_bytes = self.channels * self.audio.get_sample_size(pyaudio.paInt16)
+        total_bytes = int(self.sample_rate * duration) * frame_bytes
+        block_bytes = self.sample_rate * frame_bytes
+        bytes_read = 0
+        block = bytearray()
         
-        print(f"\nRecording complete! Saving to {output_file}")
-        
-        # Stop and close stream
-        stream.stop_stream()
-        stream.close()
-        
-        # Save recorded audio
+        # Each block goes straight to disk instead of being collected and
+        # joined into one copy of the whole recording at the end
         with wave.open(output_file, 'wb') as wf:
             wf.setnchannels(self.channels)
             wf.setsampwidth(self.audio.get_sample_size(pyaudio.paInt16))
             wf.setframerate(self.sample_rate)
-            wf.writeframes(b''.join(frames))
+            
+            def write_block():
+                # writeframesraw leaves the header to be patched once on close
+                wf.writeframesraw(block)
+                if on_block is not None:
+                    on_block(bytes(block))
+                
+                # Show recording progress
+                progress = bytes_read / total_bytes * 100
+                print(f"\rRecording progress: {progress:.1f}%", end="", flush=True)
+            
+            try:
+                while bytes_read < total_bytes and self.is_recording:
+                    try:
+                        data = self.input_queue.get(timeout=INPUT_TIMEOUT_SECONDS)
+                    except queue.Empty:
+                        raise RuntimeError("No audio received from the microphone")
+                    data = data[:total_bytes - bytes_read]
+                    block += data
+                    bytes_read += len(data)
+                    
+                    if len(block) >= block_bytes:
+                        write_block()
+                        block = bytearray()
+            except KeyboardInterrupt:
+                print("\nRecording interrupted by user")
+            finally:
+                # Pause the stream; it stays open for the next recording
+                stream.stop_stream()
+            
+            if block:
+                write_block()
+        
+        print(f"\nRecording complete! Saved to {output_file}")
         
         return output_file
     
+    def get_input_stream(self):
+        """
+        Return the microphone input stream, opening it on first use
+        
+        The stream is kept open (stopped) between recordings so back-to-back
+        takes don't each pay PortAudio's device-open latency. It is reopened
+        if sample_rate, channels or chunk_size have changed since.
+        
+        Returns:
+            pyaudio.Stream: A stopped input stream
+        """
+        config = (self.sample_rate, self.channels, self.chunk_size)
+        if self.input_stream is not None and self.input_stream_config != config:
+            self.input_stream.close()
+            self.input_stream = None
+        
+        if self.input_stream is None:
+            self.input_stream = self.audio.open(
+                format=pyaudio.paInt16,
+                channels=self.channels,
+                rate=self.sample_rate,
+                input=True,
+                frames_per_buffer=self.chunk_size,
+                start=False,
+                stream_callback=self._queue_input
+            )
+            self.input_stream_config = config
+        
+        return self.input_stream
+    
+    def _queue_input(self, in_data, frame_count, time_info, status):
+        """PyAudio stream callback: pass each captured buffer on to record_audio"""
+        self.input_queue.put(in_data)
+        return (None, pyaudio.paContinue)
+    
+    def load_audio(self, audio_file, sr=None):
+        """
+        Load an audio file as mono float32
+        
+        Files are read straight from libsndfile and only resampled when their
+        rate differs from the one asked for. librosa.load is kept as a fallback
+        for formats libsndfile can't read.
+        
+        Args:
+            audio_file (str): Path to audio file
+            sr (int): Sample rate to return (default: self.sample_rate)
+            
+        Returns:
+            tuple: (audio_data, sample_rate)
+        """
+        if sr is None:
+            sr = self.sample_rate
+        
+        try:
+            audio_data, file_sr = sf.read(audio_file, dtype='float32', always_2d=False)
+        except RuntimeError:
+            return librosa.load(audio_file, sr=sr)
+        
+        if audio_data.ndim > 1:
+            audio_data = audio_data.mean(axis=1)
+        if file_sr != sr:
+            audio_data = librosa.resample(audio_data, orig_sr=file_sr, target_sr=sr)
+        return audio_data, sr
+    
     def reduce_noise(self, audio_file, output_file=None):
         """
         Gentle noise reduction that preserves voice characteristics
@@ -97,11 +349,58 @@ class AudioToMIDITranscriber:
             base_name = os.path.splitext(audio_file)[0]
             output_file = f"{base_name}_noise_reduced.wav"
         
+        cache_file = self.noise_cache_path(audio_file)
+        if cache_file and os.path.exists(cache_file):
+            shutil.copyfile(cache_file, output_file)
+            print(f"Reusing cached noise-reduced audio: {output_file}")
+            return output_file
+        
         print("Reducing background noise...")
         
-        # Load audio file
-        audio_data, sample_rate = librosa.load(audio_file, sr=self.sample_rate)
+        # Load audio file at Basic Pitch's own rate. The denoised file is what
+        # gets transcribed, so predict() won't need to resample it again, and
+        # noise reduction has half as many samples to work through.
+        audio_data, sample_rate = self.load_audio(audio_file, sr=AUDIO_SAMPLE_RATE)
+        reduced_noise = self.denoise(audio_data, sample_rate)
         
+        # Save the noise-reduced audio
+        sf.write(output_file, reduced_noise, sample_rate)
+        
+        if cache_file:
+            # Copy under a temporary name first so a concurrent run never
+            # picks up a half-written cache entry
+            os.makedirs(self.noise_cache_dir, exist_ok=True)
+            partial_file = f"{cache_file}.{os.getpid()}.{threading.get_ident()}.tmp"
+            shutil.copyfile(output_file, partial_file)
+            os.replace(partial_file, cache_file)
+        
+        print(f"Noise reduction complete! Saved to: {output_file}")
+        return output_file
+    
+    def noise_cache_path(self, audio_file):
+        """
+        Path the noise-reduced version of audio_file is cached under, or None
+        when caching is off
+        
+        The key covers the file's path, size and modification time plus the
+        noise reduction settings, so an edited file or changed settings miss.
+        """
+        if not self.noise_cache_dir:
+            return None
+        
+        stat = os.stat(audio_file)
+        key = repr((os.path.realpath(audio_file), stat.st_size, stat.st_mtime_ns,
+                    AUDIO_SAMPLE_RATE, sorted(NOISE_REDUCTION_PARAMS.items())))
+        digest = hashlib.blake2b(key.encode(), digest_size=16).hexdigest()
+        return os.path.join(self.noise_cache_dir, f"{digest}.wav")
+    
+    def denoise(self, audio_data, sample_rate):
+        """
+        Apply the gentle noise reduction to audio already in memory
+        
+        Returns:
+            np.ndarray: Noise-reduced audio
+        """
         # Perform noise reduction using CURRENT API
         # First, we need to estimate the noise profile from the beginning of the audio
         noise_sample_length = int(0.5 * sample_rate)
@@ -112,20 +411,10 @@ class AudioToMIDITranscriber:
             y=audio_data,  # The audio signal to denoise
             sr=sample_rate,  # Sample rate
             y_noise=noise_sample,  # Noise sample for profiling
-            prop_decrease=0.5,  # Reduce noise by 50% (gentler)
-            stationary=False,  # Better for voice recordings
-            # These are the CORRECT parameters for current versions:
-            freq_mask_smooth_hz=500,  # Frequency smoothing in Hz
-            time_mask_smooth_ms=50,   # Time smoothing in milliseconds
-            n_std_thresh_stationary=1.5,  # Threshold for noise detection
+            **NOISE_REDUCTION_PARAMS,
+            **self.noise_reduction_backend,  # All CPU cores, or the GPU if torch has one
         )
-        
-        # Save the noise-reduced audio
-        import soundfile as sf
-        sf.write(output_file, reduced_noise, sample_rate)
-        
-        print(f"Noise reduction complete! Saved to: {output_file}")
-        return output_file
+        return reduced_noise
     
     def detect_pitches(self, audio_file):
         """
@@ -135,15 +424,16 @@ class AudioToMIDITranscriber:
             audio_file (str): Path to audio file
             
         Returns:
-            tuple: (midi_data, note_events)
+            tuple: (midi_data, note_events), note_events being a NOTE_EVENT_DTYPE array
         """
         print("Analyzing audio with basic-pitch...")
         
         # Use basic-pitch to predict MIDI
-        result = predict(audio_file)
+        with self.predict_lock:
+            result = predict(audio_file, self.basic_pitch_model)
         
         # Handle different return formats from basic-pitch
-        note_events = []
+        note_events = np.empty(0, dtype=NOTE_EVENT_DTYPE)
         midi_data = result[1]
         
         if midi_data is None:
@@ -153,44 +443,247 @@ class AudioToMIDITranscriber:
         
         # PRESERVE NATURAL DYNAMICS - don't destroy velocity information
         if hasattr(midi_data, 'instruments'):
-            for instrument in midi_data.instruments:
-                for note in instrument.notes:
-                    # PRESERVE the original velocity from Basic Pitch
-                    original_velocity = note.velocity
-                    
-                    # Only boost if velocity is extremely low (likely detection error)
-                    if original_velocity < 10:
-                        # Boost very low velocities to a reasonable minimum
-                        note.velocity = 40  # Soft but audible
-                    elif original_velocity > 100:
-                        # Cap maximum velocity to prevent harsh sounds
-                        note.velocity = 100
-                    else:
-                        # KEEP the original velocity - this preserves dynamics
-                        note.velocity = original_velocity
-                    
-                    # Add some natural variation to avoid robotic sound
-                    variation = random.randint(5, 15)
-                    note.velocity = max(20, min(110, note.velocity + variation))
-                    
-                    note_events.append({
-                        'pitch': note.pitch,
-                        'start': note.start,
-                        'end': note.end,
-                        'velocity': note.velocity  # Use the preserved velocity
-                    })
+            notes = [note for instrument in midi_data.instruments for note in instrument.notes]
+            
+            if notes:
+                # Work on all velocities at once instead of note by note
+                velocities = np.fromiter((note.velocity for note in notes), dtype=np.int16, count=len(notes))
+                
+                # Boost very low velocities (likely detection errors) to a soft
+                # but audible 40, cap harsh ones at 100, and KEEP the rest -
+                # this preserves dynamics
+                velocities[velocities < 10] = 40
+                np.minimum(velocities, 100, out=velocities)
+                
+                # Add some natural variation (5-15) to avoid robotic sound
+                velocities += self.rng.integers(5, 16, size=len(notes), dtype=np.int16)
+                np.clip(velocities, 20, 110, out=velocities)
+                
+                for note, velocity in zip(notes, velocities.tolist()):
+                    note.velocity = velocity
+                
+                note_events = note_events_from_notes(notes)
             
             print(f"MIDI has {len(midi_data.instruments)} instruments")
-            total_notes = sum(len(instr.notes) for instr in midi_data.instruments)
-            print(f"Total notes: {total_notes}")
+            print(f"Total notes: {len(notes)}")
             
             # Print velocity range for debugging
-            if note_events:
-                velocities = [note['velocity'] for note in note_events]
-                print(f"Velocity range: {min(velocities)} - {max(velocities)}")
+            if len(note_events):
+                print(f"Velocity range: {velocities.min()} - {velocities.max()}")
+        
+        return midi_data, note_events
+    
+    def detect_pitches_batch(self, audio_files):
+        """
+        Run detect_pitches over several files, up to MAX_CHUNK_WORKERS at a
+        time, all through the one shared Basic Pitch model
         
+        Args:
+            audio_files (list): Paths to audio files
+            
+        Returns:
+            list: (midi_data, note_events) for each file, in order
+        """
+        if len(audio_files) <= 1:
+            return [self.detect_pitches(audio_file) for audio_file in audio_files]
+        
+        max_workers = min(len(audio_files), MAX_CHUNK_WORKERS)
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            return list(executor.map(self.detect_pitches, audio_files))
+    
+    def detect_pitches_chunked(self, audio_file):
+        """
+        Like detect_pitches, but long files are split into CHUNK_SECONDS windows
+        that are transcribed in parallel and merged back together. Models that
+        aren't thread-safe transcribe the whole file in one go.
+        
+        Args:
+            audio_file (str): Path to audio file
+            
+        Returns:
+            tuple: (midi_data, note_events)
+        """
+        # Splitting only pays off when the chunks can be predicted in parallel
+        if self.predict_lock is shared_predict_lock:
+            return self.detect_pitches(audio_file)
+        
+        info = sf.info(audio_file)
+        if info.duration <= CHUNK_SECONDS + CHUNK_OVERLAP_SECONDS:
+            return self.detect_pitches(audio_file)
+        
+        chunk_frames = CHUNK_SECONDS * info.samplerate
+        overlap_frames = CHUNK_OVERLAP_SECONDS * info.samplerate
+        base_name = os.path.splitext(audio_file)[0]
+        chunk_files = []
+        
+        try:
+            # One open handle, read in consecutive blocks
+            with sf.SoundFile(audio_file) as audio:
+                for start in range(0, info.frames, chunk_frames):
+                    audio.seek(start)
+                    data = audio.read(chunk_frames + overlap_frames, dtype='float32')
+                    chunk_file = f"{base_name}_chunk{len(chunk_files)}.wav"
+                    sf.write(chunk_file, data, info.samplerate)
+                    chunk_files.append(chunk_file)
+            
+            print(f"Split {info.duration:.1f}s of audio into {len(chunk_files)} chunks")
+            results = self.detect_pitches_batch(chunk_files)
+        finally:
+            for chunk_file in chunk_files:
+                if os.path.exists(chunk_file):
+                    os.remove(chunk_file)
+        
+        midi_data, note_events = self.merge_windows(results, CHUNK_SECONDS)
+        print(f"Total notes after merging chunks: {len(note_events)}")
+        return midi_data, note_events
+    
+    def merge_windows(self, results, window_seconds):
+        """
+        Merge the transcriptions of consecutive, overlapping windows
+        
+        Window i starts at i * window_seconds and runs CHUNK_OVERLAP_SECONDS
+        into the next one. A note is kept by the window it starts in, so notes
+        in the overlap are not doubled. A note still sounding at a seam is
+        heard again from the very start of the next window (within
+        NOTE_MATCH_SECONDS); that copy extends the earlier note (which its own
+        window cut short) instead of being added. So does a note of the same
+        pitch starting within NOTE_MATCH_SECONDS of an earlier window's note,
+        i.e. one onset placed either side of the seam by the two windows. Any
+        later note in the overlap is a new attack and is kept.
+        
+        Args:
+            results (list): (midi_data, note_events) for each window, in order
+            window_seconds (float): Distance between window starts
+            
+        Returns:
+            tuple: (midi_data, note_events)
+        """
+        midi_data = pretty_midi.PrettyMIDI()
+        merged = None
+        # Latest kept note of each pitch
+        last_notes = {}
+        for i, (chunk_midi, _) in enumerate(results):
+            offset = i * window_seconds
+            # Only notes from earlier windows can be continued across the seam
+            earlier_notes = dict(last_notes)
+            
+            for instrument in chunk_midi.instruments:
+                if merged is None:
+                    merged = pretty_midi.Instrument(program=instrument.program, is_drum=instrument.is_drum,
+                                                    name=instrument.name)
+                    midi_data.instruments.append(merged)
+                
+                for note in sorted(instrument.notes, key=lambda note: note.start):
+                    if note.start >= window_seconds:
+                        continue
+                    
+                    earlier = earlier_notes.get(note.pitch)
+                    if earlier is not None and (
+                            abs(note.start + offset - earlier.start) < NOTE_MATCH_SECONDS
+                            or (note.start < NOTE_MATCH_SECONDS and earlier.end >= offset)):
+                        earlier.end = max(earlier.end, note.end + offset)
+                        continue
+                    
+                    note.start += offset
+                    note.end += offset
+                    merged.notes.append(note)
+                    last_notes[note.pitch] = note
+                for bend in instrument.pitch_bends:
+                    if bend.time < window_seconds:
+                        bend.time += offset
+                        merged.pitch_bends.append(bend)
+        
+        note_events = note_events_from_notes(merged.notes if merged is not None else [])
         return midi_data, note_events
     
+    def record_and_detect(self, duration=10, output_file=None):
+        """
+        Record audio while denoising and transcribing it in STREAM_WINDOW_SECONDS
+        windows as they fill, so only the last window is left when capture stops
+        
+        Args:
+            duration (int): Recording duration in seconds
+            output_file (str): Path to save recorded audio (optional)
+            
+        Returns:
+            tuple: (audio_file, midi_data, note_events)
+        """
+        blocks = queue.Queue()
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            windows_future = executor.submit(self._detect_streamed_windows, blocks)
+            try:
+                audio_file = self.record_audio(duration, output_file, on_block=blocks.put)
+            finally:
+                # Tells the worker the recording is over
+                blocks.put(None)
+        
+        midi_data, note_events = self.merge_windows(windows_future.result(), STREAM_WINDOW_SECONDS)
+        print(f"Total notes after merging windows: {len(note_events)}")
+        return audio_file, midi_data, note_events
+    
+    def _detect_streamed_windows(self, blocks):
+        """
+        Worker for record_and_detect: collect raw blocks from the queue and
+        transcribe each window once it (and its overlap) has been captured
+        
+        Returns:
+            list: (midi_data, note_events) for each window, in order
+        """
+        window_frames = STREAM_WINDOW_SECONDS * self.sample_rate
+        overlap_frames = CHUNK_OVERLAP_SECONDS * self.sample_rate
+        context_frames = STREAM_DENOISE_CONTEXT_SECONDS * self.sample_rate
+        # Captured samples from the start of the next window onwards, and the
+        # ones just before it that are denoised along with it
+        pending = np.empty(0, dtype=np.float32)
+        context = np.empty(0, dtype=np.float32)
+        results = []
+        finished = False
+        
+        while not finished:
+            block = blocks.get()
+            if block is None:
+                finished = True
+            else:
+                samples = np.frombuffer(block, dtype=np.int16).astype(np.float32) / 32768
+                if self.channels > 1:
+                    samples = samples.reshape(-1, self.channels).mean(axis=1)
+                pending = np.concatenate((pending, samples))
+            
+            # Once the recording is over, whatever is left makes the last,
+            # shorter window
+            while len(pending) >= window_frames + overlap_frames or (finished and len(pending)):
+                window = np.concatenate((context, pending[:window_frames + overlap_frames]))
+                results.append(self.detect_pitches_window(window, lead_in=len(context)))
+                context = np.concatenate((context, pending[:window_frames]))[-context_frames:]
+                pending = pending[window_frames:]
+        
+        return results
+    
+    def detect_pitches_window(self, samples, lead_in=0):
+        """
+        Denoise and transcribe one window of captured audio
+        
+        Args:
+            samples (np.ndarray): Mono float32 audio at self.sample_rate
+            lead_in (int): Number of samples at the start that come before the
+                           window; they are only used for noise reduction
+            
+        Returns:
+            tuple: (midi_data, note_events)
+        """
+        if self.sample_rate != AUDIO_SAMPLE_RATE:
+            samples = librosa.resample(samples, orig_sr=self.sample_rate, target_sr=AUDIO_SAMPLE_RATE)
+            lead_in = round(lead_in * AUDIO_SAMPLE_RATE / self.sample_rate)
+        
+        # predict() only takes a path
+        fd, window_file = tempfile.mkstemp(suffix='.wav')
+        os.close(fd)
+        try:
+            sf.write(window_file, self.denoise(samples, AUDIO_SAMPLE_RATE)[lead_in:], AUDIO_SAMPLE_RATE)
+            return self.detect_pitches(window_file)
+        finally:
+            os.remove(window_file)
+    
     def save_midi(self, midi_data, output_file):
         """
         Save MIDI data to file
@@ -211,31 +704,20 @@ class AudioToMIDITranscriber:
         """
         Preserve natural timing variations instead of strict quantization
         """
-        for instrument in midi_data.instruments:
-            for note in instrument.notes:
-                # Add small random timing variations to avoid robotic feel
-                timing_variation = random.uniform(-0.02, 0.02)  # ±20ms variation
-                note.start = max(0, note.start + timing_variation)
-                note.end = max(note.start + 0.1, note.end + timing_variation)
+        notes = [note for instrument in midi_data.instruments for note in instrument.notes]
+        if not notes:
+            return midi_data
         
-        return midi_data
-    
-    def add_pitch_bend_from_audio(self, midi_data, audio_file):
-        """
-        Analyze original audio for pitch bends and add them to MIDI
-        """
-        try:
-            y, sr = librosa.load(audio_file, sr=self.sample_rate)
-            
-            # Extract pitch information with higher resolution
-            pitches, magnitudes = librosa.piptrack(y=y, sr=sr, threshold=0.1, fmin=80, fmax=400)
-            
-            # Add pitch bend data to MIDI (simplified version)
-            # This would require more complex implementation for full pitch bend tracking
-            print("Adding natural pitch variations...")
-            
-        except Exception as e:
-            print(f"Could not add pitch bend data: {e}")
+        # Add small random timing variations to avoid robotic feel
+        timing_variation = self.rng.uniform(-0.02, 0.02, size=len(notes))  # ±20ms variation
+        starts = np.fromiter((note.start for note in notes), dtype=np.float64, count=len(notes))
+        ends = np.fromiter((note.end for note in notes), dtype=np.float64, count=len(notes))
+        starts = np.maximum(0, starts + timing_variation)
+        ends = np.maximum(starts + 0.1, ends + timing_variation)
+        
+        for note, start, end in zip(notes, starts.tolist(), ends.tolist()):
+            note.start = start
+            note.end = end
         
         return midi_data
     
@@ -290,80 +772,92 @@ class AudioToMIDITranscriber:
         return midi_data
 
     def cleanup(self):
-        """Clean up audio resources"""
-        self.audio.terminate()
+        """
+        Clean up audio resources
+        
+        Safe to call more than once, and does nothing if the transcriber
+        never recorded; recording again afterwards reopens PortAudio.
+        """
+        if self.input_stream is not None:
+            self.input_stream.close()
+            self.input_stream = None
+        if self._audio is not None:
+            self._audio.terminate()
+            self._audio = None
     
-    def transcribe_live(self, duration=10, output_midi=None):
+    def transcribe_live(self, duration=10, output_midi=None, keep_original=False):
         """
         Complete transcription pipeline: record -> detect -> save MIDI
         
         Args:
             duration (int): Recording duration in seconds
             output_midi (str): Path for output MIDI file (optional)
+            keep_original (bool): Also transcribe the un-denoised recording
+            
+        Returns:
+            list: Paths to generated MIDI files, [original_midi, clean_midi]
+                  when keep_original is set, otherwise [clean_midi]
         """
         try:
-            # Step 1: Record audio
-            audio_file = self.record_audio(duration)
-            
-            # Step 2: Reduce noise
-            noise_reduced_file = self.reduce_noise(audio_file)
-            
-            # Step 3: Detect pitches from both original and noise-reduced files
-            print("\n=== Processing Original Audio ===")
-            midi_data_original, note_events_original = self.detect_pitches(audio_file)
-            
-            print("\n=== Processing Noise-Reduced Audio ===")
-            midi_data_clean, note_events_clean = self.detect_pitches(noise_reduced_file)
+            if keep_original:
+                # Step 1: Record audio
+                audio_file = self.record_audio(duration)
+                
+                # Step 2: Reduce noise
+                noise_reduced_file = self.reduce_noise(audio_file)
+                
+                # Step 3: Detect pitches from both original and noise-reduced files
+                sources = self._transcription_sources(audio_file, noise_reduced_file, keep_original)
+                results = self._detect_sources(self.detect_pitches, sources)
+            else:
+                # Steps 1-3: Record, denoising and transcribing each window
+                # while the rest is still being captured
+                audio_file, midi_data, note_events = self.record_and_detect(duration)
+                noise_reduced_file = None
+                sources = [('clean', audio_file)]
+                results = {'clean': (midi_data, note_events)}
             
             # Step 4: Add natural variations
             print("\n=== Adding Natural Variations ===")
-            midi_data_original = self.preserve_natural_timing(midi_data_original)
-            midi_data_original = self.add_pitch_bend_from_audio(midi_data_original, audio_file)
+            for label, _ in sources:
+                midi_data, note_events = results[label]
+                results[label] = (self.preserve_natural_timing(midi_data), note_events)
             
-            midi_data_clean = self.preserve_natural_timing(midi_data_clean)
-            midi_data_clean = self.add_pitch_bend_from_audio(midi_data_clean, noise_reduced_file)
-            
-            # Step 5: Save MIDI files for both versions
+            # Step 5: Save MIDI files
             timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
             
-            if output_midi is None:
-                original_midi = f"transcription_original_{timestamp}.mid"
-                clean_midi = f"transcription_clean_{timestamp}.mid"
-            else:
-                base_name = os.path.splitext(output_midi)[0]
-                original_midi = f"{base_name}_original.mid"
-                clean_midi = f"{base_name}_clean.mid"
-            
+            output_files = []
             print(f"\n=== Saving MIDI Files ===")
-            self.save_midi(midi_data_original, original_midi)
-            self.save_midi(midi_data_clean, clean_midi)
+            for label, _ in sources:
+                if output_midi is None:
+                    midi_path = f"transcription_{label}_{timestamp}.mid"
+                else:
+                    base_name = os.path.splitext(output_midi)[0]
+                    midi_path = f"{base_name}_{label}.mid"
+                self.save_midi(results[label][0], midi_path)
+                output_files.append(midi_path)
             
-            # Print comparison summary
-            print(f"\n=== Transcription Summary ===")
-            print(f"Original audio: {audio_file}")
-            print(f"Noise-reduced audio: {noise_reduced_file}")
-            print(f"Original MIDI: {original_midi} ({len(note_events_original)} notes)")
-            print(f"Clean MIDI: {clean_midi} ({len(note_events_clean)} notes)")
+            self._print_summary(audio_file, noise_reduced_file, sources, results, output_files)
             
-            return [original_midi, clean_midi]
+            return output_files
             
         except Exception as e:
             print(f"Error during transcription: {e}")
             return None
-        finally:
-            self.cleanup()
     
-    def transcribe_file(self, audio_file, output_midi=None, instrument_name=None):
+    def transcribe_file(self, audio_file, output_midi=None, instrument_name=None, keep_original=False):
         """
-        Transcribe an existing audio file to MIDI (both original and noise-reduced versions)
+        Transcribe an existing audio file to MIDI from its noise-reduced version
         
         Args:
             audio_file (str): Path to existing audio file
             output_midi (str): Base path for output MIDI files (optional)
             instrument_name (str): Name of the instrument to set in MIDI (optional)
+            keep_original (bool): Also transcribe the un-denoised audio
             
         Returns:
-            list: Paths to generated MIDI files [original_midi, clean_midi]
+            list: Paths to generated MIDI files, [original_midi, clean_midi]
+                  when keep_original is set, otherwise [clean_midi]
         """
         if not os.path.exists(audio_file):
             print(f"Error: {audio_file} not found!")
@@ -375,57 +869,78 @@ class AudioToMIDITranscriber:
             # Step 1: Reduce noise
             noise_reduced_file = self.reduce_noise(audio_file)
             
-            # Step 2: Detect pitches from both original and noise-reduced files
-            print("\n=== Processing Original Audio ===")
-            midi_data_original, note_events_original = self.detect_pitches(audio_file)
-            
-            print("\n=== Processing Noise-Reduced Audio ===")
-            midi_data_clean, note_events_clean = self.detect_pitches(noise_reduced_file)
+            # Step 2: Detect pitches, skipping the original unless asked for
+            sources = self._transcription_sources(audio_file, noise_reduced_file, keep_original)
+            results = self._detect_sources(self.detect_pitches_chunked, sources)
             
             # Step 3: Add natural variations
             print("\n=== Adding Natural Variations ===")
-            midi_data_original = self.preserve_natural_timing(midi_data_original)
-            midi_data_original = self.add_pitch_bend_from_audio(midi_data_original, audio_file)
-            
-            midi_data_clean = self.preserve_natural_timing(midi_data_clean)
-            midi_data_clean = self.add_pitch_bend_from_audio(midi_data_clean, noise_reduced_file)
+            for label, _ in sources:
+                midi_data, note_events = results[label]
+                results[label] = (self.preserve_natural_timing(midi_data), note_events)
             
             # Step 3.5: Set instrument if specified
             if instrument_name:
                 print(f"\n=== Setting Instrument: {instrument_name} ===")
-                midi_data_original = self.set_instrument_program(midi_data_original, instrument_name)
-                midi_data_clean = self.set_instrument_program(midi_data_clean, instrument_name)
+                for label, _ in sources:
+                    midi_data, note_events = results[label]
+                    results[label] = (self.set_instrument_program(midi_data, instrument_name), note_events)
             
-            # Step 4: Save MIDI files for both versions
+            # Step 4: Save MIDI files
             timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
             base_name = os.path.splitext(os.path.basename(audio_file))[0]
             
-            if output_midi is None:
-                original_midi = f"{base_name}_original_{timestamp}.mid"
-                clean_midi = f"{base_name}_clean_{timestamp}.mid"
-            else:
-                base_output = os.path.splitext(output_midi)[0]
-                original_midi = f"{base_output}_original.mid"
-                clean_midi = f"{base_output}_clean.mid"
-            
+            output_files = []
             print(f"\n=== Saving MIDI Files ===")
-            self.save_midi(midi_data_original, original_midi)
-            self.save_midi(midi_data_clean, clean_midi)
+            for label, _ in sources:
+                if output_midi is None:
+                    midi_path = f"{base_name}_{label}_{timestamp}.mid"
+                else:
+                    base_output = os.path.splitext(output_midi)[0]
+                    midi_path = f"{base_output}_{label}.mid"
+                self.save_midi(results[label][0], midi_path)
+                output_files.append(midi_path)
             
-            # Print comparison summary
-            print(f"\n=== Transcription Summary ===")
-            print(f"Original audio: {audio_file}")
-            print(f"Noise-reduced audio: {noise_reduced_file}")
-            print(f"Original MIDI: {original_midi} ({len(note_events_original)} notes)")
-            print(f"Clean MIDI: {clean_midi} ({len(note_events_clean)} notes)")
+            self._print_summary(audio_file, noise_reduced_file, sources, results, output_files)
             
-            return [original_midi, clean_midi]
+            return output_files
             
         except Exception as e:
             print(f"Error during transcription: {e}")
             return None
-        finally:
-            self.cleanup()
+    
+    def _transcription_sources(self, audio_file, noise_reduced_file, keep_original):
+        """List the (label, path) pairs to transcribe, original first"""
+        sources = [('original', audio_file)] if keep_original else []
+        sources.append(('clean', noise_reduced_file))
+        return sources
+    
+    def _detect_sources(self, detect, sources):
+        """
+        Run pitch detection over each source, side by side when there is more than one
+        
+        Returns:
+            dict: label -> (midi_data, note_events)
+        """
+        if len(sources) == 1:
+            print("\n=== Processing Noise-Reduced Audio ===")
+            label, path = sources[0]
+            return {label: detect(path)}
+        
+        # The passes are independent, so run them side by side
+        print("\n=== Processing Original and Noise-Reduced Audio ===")
+        with ThreadPoolExecutor(max_workers=len(sources)) as executor:
+            futures = {label: executor.submit(detect, path) for label, path in sources}
+        return {label: future.result() for label, future in futures.items()}
+    
+    def _print_summary(self, audio_file, noise_reduced_file, sources, results, output_files):
+        """Print the paths and note counts of a finished transcription"""
+        print(f"\n=== Transcription Summary ===")
+        print(f"Original audio: {audio_file}")
+        if noise_reduced_file:
+            print(f"Noise-reduced audio: {noise_reduced_file}")
+        for (label, _), midi_path in zip(sources, output_files):
+            print(f"{label.capitalize()} MIDI: {midi_path} ({len(results[label][1])} notes)")
 
 def main():
     """Main function with command line interface"""
@@ -440,6 +955,8 @@ def main():
                        help="Audio sample rate (default: 44100)")
     parser.add_argument("--file", "-f", type=str,
                        help="Process existing audio file instead of recording")
+    parser.add_argument("--keep-original", action="store_true",
+                       help="Also write a MIDI file transcribed from the un-denoised audio")
     
     args = parser.parse_args()
     
@@ -460,14 +977,16 @@ def main():
             print(f"Processing file: {input_file}")
             output_files = transcriber.transcribe_file(
                 audio_file=input_file,
-                output_midi=args.output
+                output_midi=args.output,
+                keep_original=args.keep_original
             )
         else:
             # Record and process
             print(f"Recording duration: {args.duration} seconds")
             output_files = transcriber.transcribe_live(
                 duration=args.duration,
-                output_midi=args.output
+                output_midi=args.output,
+                keep_original=args.keep_original
             )
         
         if output_files:
@@ -482,6 +1001,8 @@ def main():
         print("\n\nTranscription cancelled by user")
     except Exception as e:
         print(f"\nError: {e}")
+    finally:
+        transcriber.cleanup()
 
 if __name__ == "__main__":
     main()
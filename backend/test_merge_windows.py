@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Tests for merging overlapping transcription windows back into one MIDI
+"""
+
+import re
+from contextlib import nullcontext
+import numpy as np
+import pretty_midi
+import soundfile as sf
+from spotify_transcriber import (AudioToMIDITranscriber, CHUNK_SECONDS, NOTE_MATCH_SECONDS, STREAM_WINDOW_SECONDS,
+                                 note_events_from_notes)
+
+def window(*notes):
+    """A (midi_data, note_events) window result holding (pitch, start, end) notes"""
+    midi_data = pretty_midi.PrettyMIDI()
+    instrument = pretty_midi.Instrument(program=0)
+    instrument.notes = [pretty_midi.Note(velocity=80, pitch=pitch, start=start, end=end)
+                        for pitch, start, end in notes]
+    midi_data.instruments.append(instrument)
+    return midi_data, note_events_from_notes(instrument.notes)
+
+def merge(*windows, window_seconds=CHUNK_SECONDS):
+    """Merge window results; merge_windows needs no audio device or model"""
+    transcriber = AudioToMIDITranscriber.__new__(AudioToMIDITranscriber)
+    return transcriber.merge_windows(list(windows), window_seconds)
+
+def test_note_crossing_seam_is_kept_once():
+    # Window 0 hears the note until it ends, window 1 hears it again from its
+    # first frame
+    midi_data, note_events = merge(
+        window((60, 29.5, CHUNK_SECONDS + 1)),
+        window((60, 0.0, 2.0), (64, 0.5, 1.0)),
+    )
+    
+    notes = sorted(midi_data.instruments[0].notes, key=lambda note: note.pitch)
+    assert [(note.pitch, note.start, note.end) for note in notes] == [
+        (60, 29.5, CHUNK_SECONDS + 2.0),
+        (64, CHUNK_SECONDS + 0.5, CHUNK_SECONDS + 1.0),
+    ]
+    assert len(note_events) == 2
+    assert note_events[note_events['pitch'] == 60]['end'][0] == CHUNK_SECONDS + 2.0
+
+def test_note_ending_before_seam_is_not_extended():
+    midi_data, note_events = merge(
+        window((60, 29.0, 29.5)),
+        window((60, 0.25, 1.0)),
+    )
+    
+    notes = midi_data.instruments[0].notes
+    assert [(note.start, note.end) for note in notes] == [(29.0, 29.5), (CHUNK_SECONDS + 0.25, CHUNK_SECONDS + 1.0)]
+    assert len(note_events) == 2
+
+def test_onset_split_by_seam_is_kept_once():
+    # Window 0 places a short note just before the seam, window 1 just after it
+    start = CHUNK_SECONDS - NOTE_MATCH_SECONDS / 2
+    midi_data, note_events = merge(
+        window((60, start, start + 0.01)),
+        window((60, 0.0, 0.25)),
+    )
+    
+    notes = midi_data.instruments[0].notes
+    assert [(note.start, note.end) for note in notes] == [(start, CHUNK_SECONDS + 0.25)]
+    assert len(note_events) == 1
+
+def test_notes_starting_in_overlap_belong_to_next_window():
+    midi_data, note_events = merge(
+        window((62, CHUNK_SECONDS + 0.5, CHUNK_SECONDS + 0.75)),
+        window((62, 0.5, 0.75)),
+    )
+    
+    notes = midi_data.instruments[0].notes
+    assert [(note.start, note.end) for note in notes] == [(CHUNK_SECONDS + 0.5, CHUNK_SECONDS + 0.75)]
+
+def test_repeated_note_in_overlap_is_kept():
+    # Window 0 hears the note end 0.25s past the seam; window 1 hears that
+    # tail and then the same pitch struck again
+    seam = STREAM_WINDOW_SECONDS
+    midi_data, note_events = merge(
+        window((60, seam - 1, seam + 0.25)),
+        window((60, 0.0, 0.25), (60, 0.5, 1.0)),
+        window_seconds=seam,
+    )
+    
+    notes = midi_data.instruments[0].notes
+    assert [(note.start, note.end) for note in notes] == [(seam - 1, seam + 0.25), (seam + 0.5, seam + 1.0)]
+    assert len(note_events) == 2
+
+def test_chunked_file_keeps_repeated_note_after_chunk_boundary(tmp_path):
+    # 70s of audio makes three chunks; the first hears a note ring 0.25s past
+    # the 30s boundary, the second hears that tail and the note struck again
+    audio_file = str(tmp_path / "long.wav")
+    sf.write(audio_file, np.zeros(70 * 1000, dtype=np.float32), 1000)
+    chunk_windows = [
+        window((60, 29.0, CHUNK_SECONDS + 0.25)),
+        window((60, 0.0, 0.25), (60, 0.5, 1.0)),
+        window(),
+    ]
+    
+    transcriber = AudioToMIDITranscriber.__new__(AudioToMIDITranscriber)
+    # Chunking only runs when predictions can run in parallel
+    transcriber.predict_lock = nullcontext()
+    transcriber.detect_pitches = lambda chunk_file: chunk_windows[int(re.search(r"_chunk(\d+)", chunk_file).group(1))]
+    midi_data, note_events = transcriber.detect_pitches_chunked(audio_file)
+    
+    notes = midi_data.instruments[0].notes
+    assert [(note.start, note.end) for note in notes] == [
+        (29.0, CHUNK_SECONDS + 0.25),
+        (CHUNK_SECONDS + 0.5, CHUNK_SECONDS + 1.0),
+    ]
+    assert len(note_events) == 2
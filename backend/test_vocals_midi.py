@@ -5,42 +5,59 @@ and output MIDI using functions from spotify_transcriber.py
 """
 
 import os
-from spotify_transcriber import AudioToMIDITranscriber
+from spotify_transcriber import AudioToMIDITranscriber, DEFAULT_NOISE_CACHE_DIR
 
-def test_vocals_to_midi():
-    """Test processing vocals-only file to MIDI"""
-    
-    # Input file
-    vocals_file = "bass_20250927_160637_noise_reduced (1).wav"
+def run(vocals_file, title, noise_cache_dir=None, label="Conversion"):
+    """
+    Transcribe the noise-reduced version of vocals_file to MIDI
     
+    Args:
+        vocals_file (str): Path to the vocals audio file
+        title (str): Heading printed before processing
+        noise_cache_dir (str): Where to keep noise-reduced audio between runs
+        label (str): What the success/failure messages call the conversion
+        
+    Returns:
+        list: List of generated MIDI file paths, or None if failed
+    """
     # Check if file exists
     if not os.path.exists(vocals_file):
         print(f"Error: {vocals_file} not found!")
         return None
     
-    print("=== Testing Vocals to MIDI Conversion ===")
+    print(f"=== {title} ===")
     print(f"Input file: {vocals_file}")
     
-    # Create transcriber instance
-    transcriber = AudioToMIDITranscriber()
+    # Create transcriber instance; it only opens PortAudio if asked to record
+    transcriber = AudioToMIDITranscriber(noise_cache_dir=noise_cache_dir)
     
     try:
-        # Use the new transcribe_file method that processes both original and noise-reduced versions
-        output_files = transcriber.transcribe_file(vocals_file)
+        # Only the noise-reduced version is needed, so skip the original pass
+        output_files = transcriber.transcribe_file(vocals_file, keep_original=False)
         
         if output_files:
-            print(f"\n✅ Conversion complete!")
+            print(f"\n✅ {label} complete!")
             print(f"Generated MIDI files:")
             for i, file in enumerate(output_files):
                 print(f"  {i+1}. {file}")
             return output_files
         else:
-            print("\n❌ Conversion failed!")
+            print(f"\n❌ {label} failed!")
             return None
         
     except Exception as e:
-        print(f"\n❌ Error during conversion: {e}")
+        print(f"\n❌ Error during {label.lower()}: {e}")
         return None
+    finally:
+        transcriber.cleanup()
+
+def test_vocals_to_midi():
+    """Test processing vocals-only file to MIDI"""
+    # This script is rerun on the same file, so keep its noise-reduced audio
+    # between runs
+    return run("bass_20250927_160637_noise_reduced (1).wav",
+               "Testing Vocals to MIDI Conversion",
+               noise_cache_dir=DEFAULT_NOISE_CACHE_DIR)
 
 def process_vocals_file(vocals_file_path):
     """
@@ -52,36 +69,8 @@ def process_vocals_file(vocals_file_path):
     Returns:
         list: List of generated MIDI file paths, or None if failed
     """
-    # Check if file exists
-    if not os.path.exists(vocals_file_path):
-        print(f"Error: {vocals_file_path} not found!")
-        return None
-    
-    print("=== Processing Vocals to MIDI ===")
-    print(f"Input file: {vocals_file_path}")
-    
-    # Create transcriber instance
-    transcriber = AudioToMIDITranscriber()
-    
-    try:
-        # Use the transcribe_file method that processes both original and noise-reduced versions
-        output_files = transcriber.transcribe_file(vocals_file_path)
-        
-        if output_files:
-            print(f"\n✅ Vocals conversion complete!")
-            print(f"Generated MIDI files:")
-            for i, file in enumerate(output_files):
-                print(f"  {i+1}. {file}")
-            return output_files
-        else:
-            print("\n❌ Vocals conversion failed!")
-            return None
-        
-    except Exception as e:
-        print(f"\n❌ Error during vocals conversion: {e}")
-        return None
-    finally:
-        transcriber.cleanup()
+    return run(vocals_file_path, "Processing Vocals to MIDI",
+               label="Vocals conversion")
 
 if __name__ == "__main__":
     import argparse
@@ -10,12 +10,51 @@ import librosa
 import pretty_midi
 import numpy as np
 
+# madmom's CNN onset detector is more reliable on close hits than librosa's
+# peak picking; it's optional, and librosa is used when it isn't installed
+try:
+    from madmom.features.onsets import CNNOnsetProcessor, OnsetPeakPickingProcessor
+    from madmom.processors import SequentialProcessor
+except ImportError:
+    SequentialProcessor = None
+
 # Map instrument names to General MIDI drum note numbers
 DRUM_MAP = {
     "snare": 38,   # Acoustic Snare
     "cymbal": 49   # Crash Cymbal 1 (could also use 42/46 for hi-hats)
 }
 
+# Built on first use; loading the CNN weights is the slow part
+_onset_processor = None
+
+def detect_onsets(audio_file):
+    """
+    Find the percussive hits in a recording.
+    
+    Args:
+        audio_file (str): Path to .wav recording
+    
+    Returns:
+        np.ndarray: Onset times in seconds
+    """
+    global _onset_processor
+
+    if SequentialProcessor is not None:
+        if _onset_processor is None:
+            # The CNN produces 100 activation frames per second
+            _onset_processor = SequentialProcessor([
+                CNNOnsetProcessor(),
+                OnsetPeakPickingProcessor(fps=100),
+            ])
+        return _onset_processor(audio_file)
+
+    # Load audio
+    y, sr = librosa.load(audio_file, sr=None)
+
+    # Onset detection (find percussive hits)
+    onset_frames = librosa.onset.onset_detect(y=y, sr=sr, units="frames", backtrack=False, delta=0.2)
+    return librosa.frames_to_time(onset_frames, sr=sr)
+
 def audio_to_drum_midi(audio_file, instrument="snare", velocity=90, output_midi="drums.mid"):
     """
     Convert a percussive recording (snare or cymbal) into a MIDI file.
@@ -34,25 +73,19 @@ def audio_to_drum_midi(audio_file, instrument="snare", velocity=90, output_midi=
 
     midi_note = DRUM_MAP[instrument]
 
-    # Load audio
-    y, sr = librosa.load(audio_file, sr=None)
-
-    # Onset detection (find percussive hits)
-    onset_frames = librosa.onset.onset_detect(y=y, sr=sr, units="frames", backtrack=False, delta=0.2)
-    onset_times = librosa.frames_to_time(onset_frames, sr=sr)
+    onset_times = detect_onsets(audio_file)
 
     # Create MIDI object
     midi_data = pretty_midi.PrettyMIDI()
     drum = pretty_midi.Instrument(program=0, is_drum=True)
 
-    for t in onset_times:
-        note = pretty_midi.Note(
-            velocity=velocity,
-            pitch=midi_note,
-            start=t,
-            end=t + (0.3 if instrument == "cymbal" else 0.2)  # cymbals ring longer
-        )
-        drum.notes.append(note)
+    duration = 0.3 if instrument == "cymbal" else 0.2  # cymbals ring longer
+    starts = np.asarray(onset_times, dtype=np.float64)
+    ends = starts + duration
+    drum.notes.extend([
+        pretty_midi.Note(velocity=velocity, pitch=midi_note, start=start, end=end)
+        for start, end in zip(starts.tolist(), ends.tolist())
+    ])
 
     midi_data.instruments.append(drum)
     midi_data.write(output_midi)
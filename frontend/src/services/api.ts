@@ -1,4 +1,8 @@
 const API_BASE_URL = 'http://localhost:3001/api';
+const JOB_POLL_INTERVAL_MS = 1000;
+// Give up on a job after this long; the server marks abandoned jobs failed
+// well before then (JOB_TIMEOUT_SECONDS plus one sweep interval)
+const JOB_MAX_WAIT_MS = 45 * 60 * 1000;
 
 export interface ConversionResult {
   success: boolean;
@@ -8,6 +12,14 @@ export interface ConversionResult {
   details?: string;
 }
 
+interface TranscriptionJob {
+  job_id: string;
+  status: 'queued' | 'processing' | 'completed' | 'failed';
+  midiPath?: string;
+  error?: string;
+  details?: string;
+}
+
 
 // Common MIDI instruments
 export const MIDI_INSTRUMENTS = [
@@ -45,38 +57,75 @@ export const transcribeSingle = async (audioBlob: Blob, instrument: string): Pro
   return await response.blob();
 };
 
+const readErrorResponse = async (response: Response): Promise<ConversionResult> => {
+  // If it's an error response, try to get JSON error details
+  try {
+    const errorData = await response.json();
+    return {
+      success: false,
+      error: errorData.error || `HTTP error! status: ${response.status}`,
+      details: errorData.details
+    };
+  } catch {
+    // If error response isn't JSON, return generic error
+    return {
+      success: false,
+      error: `HTTP error! status: ${response.status}`,
+    };
+  }
+};
+
+const waitForJob = async (jobId: string): Promise<ConversionResult> => {
+  const deadline = Date.now() + JOB_MAX_WAIT_MS;
+  while (Date.now() < deadline) {
+    await new Promise(resolve => setTimeout(resolve, JOB_POLL_INTERVAL_MS));
+
+    const response = await fetch(`${API_BASE_URL}/jobs/${jobId}`);
+    if (!response.ok) {
+      return readErrorResponse(response);
+    }
+
+    const job: TranscriptionJob = await response.json();
+    if (job.status === 'completed') {
+      return {
+        success: true,
+        message: 'MIDI file generated successfully',
+        midiPath: job.midiPath
+      };
+    }
+    if (job.status === 'failed') {
+      return {
+        success: false,
+        error: job.error || 'Transcription failed',
+        details: job.details
+      };
+    }
+  }
+
+  return {
+    success: false,
+    error: 'Timed out waiting for the transcription to finish',
+  };
+};
+
 export const convertWavToMidi = async (audioBlob: Blob, instrument: string): Promise<ConversionResult> => {
   const formData = new FormData();
   formData.append('audio', audioBlob, 'recording.wav');
   formData.append('instrument', instrument);
 
   try {
-    const response = await fetch(`${API_BASE_URL}/transcribe-single`, {
+    // Queue the transcription, then poll until the server finishes it
+    const response = await fetch(`${API_BASE_URL}/jobs`, {
       method: 'POST',
       body: formData,
     });
 
     if (!response.ok) {
-      // If it's an error response, try to get JSON error details
-      try {
-        const errorData = await response.json();
-        return {
-          success: false,
-          error: errorData.error || `HTTP error! status: ${response.status}`,
-          details: errorData.details
-        };
-      } catch {
-        // If error response isn't JSON, return generic error
-        return {
-          success: false,
-          error: `HTTP error! status: ${response.status}`,
-        };
-      }
+      return readErrorResponse(response);
     }
 
-    // Success - the response is now JSON with the MIDI file path
-    const result = await response.json();
-    return result;
+    const job: TranscriptionJob = await response.json();
+    return await waitForJob(job.job_id);
   } catch (error) {
     console.error('Error converting WAV to MIDI:', error);
     return {
@@ -86,7 +135,6 @@ export const convertWavToMidi = async (audioBlob: Blob, instrument: string): Pro
   }
 };
 
-
 export const downloadMidiFile = async (filePath: string) => {
   try {
     const filename = filePath.includes('/') ? filePath : filePath; // Handle both full paths and just filenames